@@ -1,19 +1,201 @@
 """
 API Key authentication for external system integration.
 """
+import asyncio
+import logging
+import os
 import secrets
 import hashlib
+import time
 from datetime import datetime
-from fastapi import Security, HTTPException, status, Depends
+from typing import Dict, NamedTuple, Optional, Tuple
+from fastapi import Security, HTTPException, Response, status, Depends
 from fastapi.security import APIKeyHeader
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, case, event, inspect
+from sqlalchemy.orm import Session
 from app.models import APIKey
-from app.database import get_db
+from app.database import async_session_maker, read_session_maker
+from app.rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
 
 api_key_header = APIKeyHeader(name="auth", auto_error=False)
 
 
+class VerifiedAPIKey(NamedTuple):
+    """Immutable snapshot of a validated API key, safe to share between requests."""
+    id: int
+    name: str
+    key_prefix: str
+    can_read: bool
+    can_write: bool
+    can_delete: bool
+    rate_limit_per_minute: int
+    expires_at: Optional[datetime]
+
+
+class APIKeyCache:
+    """
+    In-memory cache of validated API keys by key hash, with write-behind
+    of last_used_at.
+
+    - A cached key is trusted for `ttl` seconds. Changes committed through
+      any session in this process invalidate it right away (see the session
+      hooks below); changes made elsewhere (scripts, other workers) are
+      picked up when the entry expires.
+    - Unknown/inactive keys are not cached, so revocations never wait on
+      a negative entry.
+    - last_used_at is recorded in memory and written every
+      `flush_interval` seconds in one UPDATE for all used keys.
+    """
+
+    def __init__(self, ttl: float = 30.0, flush_interval: float = 5.0):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+
+        self._keys: Dict[str, Tuple[VerifiedAPIKey, float]] = {}  # key_hash -> (key, cached_at)
+        self._last_used: Dict[int, datetime] = {}  # key_id -> pending last_used_at
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, key_hash: str) -> Optional[VerifiedAPIKey]:
+        entry = self._keys.get(key_hash)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            self._keys.pop(key_hash, None)
+            return None
+        return entry[0]
+
+    def put(self, key_hash: str, api_key: APIKey) -> VerifiedAPIKey:
+        verified = VerifiedAPIKey(
+            id=api_key.id,
+            name=api_key.name,
+            key_prefix=api_key.key_prefix,
+            can_read=api_key.can_read,
+            can_write=api_key.can_write,
+            can_delete=api_key.can_delete,
+            rate_limit_per_minute=api_key.rate_limit_per_minute,
+            expires_at=api_key.expires_at
+        )
+        if self.ttl > 0:
+            self._keys[key_hash] = (verified, time.monotonic())
+        return verified
+
+    def invalidate(self, key_hash: Optional[str] = None) -> None:
+        """Drop one cached key, or all of them."""
+        if key_hash is None:
+            self._keys.clear()
+        else:
+            self._keys.pop(key_hash, None)
+
+    def record_use(self, key_id: int) -> None:
+        self._last_used[key_id] = datetime.utcnow()
+
+    async def flush(self) -> int:
+        """Write pending last_used_at values in one UPDATE; returns the number of keys."""
+        if not self._last_used:
+            return 0
+        pending, self._last_used = self._last_used, {}
+
+        try:
+            async with async_session_maker() as session:
+                await session.execute(
+                    update(APIKey)
+                    .where(APIKey.id.in_(list(pending)))
+                    .values(last_used_at=case(pending, value=APIKey.id))
+                    .execution_options(synchronize_session=False, api_key_usage_only=True)
+                )
+                await session.commit()
+        except Exception:
+            # Keep the timestamps for the next attempt unless newer ones arrived
+            for key_id, used_at in pending.items():
+                self._last_used.setdefault(key_id, used_at)
+            raise
+        return len(pending)
+
+    def start(self) -> None:
+        """Start the background last_used_at flusher."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush API key usage: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to flush API key usage: {str(e)}")
+
+
+api_key_cache = APIKeyCache(
+    ttl=float(os.getenv("API_KEY_CACHE_TTL", "30")),
+    flush_interval=float(os.getenv("API_KEY_LAST_USED_FLUSH_INTERVAL", "5"))
+)
+
+
+# Keys changed in a session are dropped from the cache once the change is
+# committed, whatever code path made it. session.info["changed_api_keys"]
+# holds the key hashes, or None for "all keys" (bulk UPDATE/DELETE).
+_CHANGED_KEYS = "changed_api_keys"
+
+
+def _mark_changed(session: Session, key_hash: Optional[str]) -> None:
+    changed = session.info.setdefault(_CHANGED_KEYS, set())
+    changed.add(key_hash)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_api_keys(session: Session, flush_context) -> None:
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, APIKey):
+            _mark_changed(session, obj.key_hash)
+            for old_hash in inspect(obj).attrs.key_hash.history.deleted:
+                _mark_changed(session, old_hash)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_api_key_changes(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is APIKey:
+        if not orm_execute_state.execution_options.get("api_key_usage_only"):
+            _mark_changed(orm_execute_state.session, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_api_keys(session: Session) -> None:
+    changed = session.info.pop(_CHANGED_KEYS, None)
+    if not changed:
+        return
+    if None in changed:
+        api_key_cache.invalidate()
+    else:
+        for key_hash in changed:
+            api_key_cache.invalidate(key_hash)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_changed_api_keys(session: Session, previous_transaction) -> None:
+    session.info.pop(_CHANGED_KEYS, None)
+
+
 def generate_api_key() -> str:
     """Generate a secure random API key."""
     return f"pak_{secrets.token_urlsafe(32)}"
@@ -30,12 +212,12 @@ def get_key_prefix(api_key: str) -> str:
 
 
 async def verify_api_key(
-    api_key: str = Security(api_key_header),
-    db: AsyncSession = Depends(get_db)
-) -> APIKey:
+    api_key: str = Security(api_key_header)
+) -> VerifiedAPIKey:
     """
-    Verify API key and return the APIKey object.
+    Verify API key and return a snapshot of it.
     Raises HTTPException if invalid.
+    Cached keys need no database access; last_used_at is written behind.
     """
     if not api_key:
         raise HTTPException(
@@ -46,33 +228,59 @@ async def verify_api_key(
     # Hash the provided key
     key_hash = hash_api_key(api_key)
 
-    # Query database
-    result = await db.execute(
-        select(APIKey).where(
-            APIKey.key_hash == key_hash,
-            APIKey.is_active == True
-        )
-    )
-    api_key_obj = result.scalar_one_or_none()
+    verified = api_key_cache.get(key_hash)
+    if verified is None:
+        # Query database
+        async with read_session_maker() as db:
+            result = await db.execute(
+                select(APIKey).where(
+                    APIKey.key_hash == key_hash,
+                    APIKey.is_active == True
+                )
+            )
+            api_key_obj = result.scalar_one_or_none()
 
-    if not api_key_obj:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or inactive API key"
-        )
+        if not api_key_obj:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or inactive API key"
+            )
+
+        verified = api_key_cache.put(key_hash, api_key_obj)
 
     # Check expiration
-    if api_key_obj.expires_at and api_key_obj.expires_at < datetime.utcnow():
+    if verified.expires_at and verified.expires_at < datetime.utcnow():
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API key has expired"
         )
 
-    # Update last used timestamp
-    api_key_obj.last_used_at = datetime.utcnow()
-    await db.commit()
+    # Update last used timestamp (flushed in batches)
+    api_key_cache.record_use(verified.id)
+
+    return verified
+
+
+async def enforce_rate_limit(
+    response: Response,
+    api_key: VerifiedAPIKey = Security(verify_api_key)
+) -> VerifiedAPIKey:
+    """
+    Apply the key's rate_limit_per_minute (token bucket).
+    Adds X-RateLimit-* headers; raises 429 with Retry-After when exhausted.
+    """
+    result = await rate_limiter.take(api_key.id, api_key.rate_limit_per_minute)
+    headers = result.headers()
+
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit of {result.limit} requests per minute exceeded",
+            headers=headers
+        )
 
-    return api_key_obj
+    response.headers.update(headers)
+    return api_key
 
 
 def require_permission(permission: str):
@@ -80,7 +288,7 @@ def require_permission(permission: str):
     Dependency to check if API key has specific permission.
     Usage: require_permission("write")
     """
-    async def check_permission(api_key: APIKey = Security(verify_api_key)):
+    async def check_permission(api_key: VerifiedAPIKey = Security(enforce_rate_limit)):
         if permission == "read" and not api_key.can_read:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
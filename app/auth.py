@@ -2,18 +2,22 @@
 Authentication and authorization utilities.
 Implements JWT token-based authentication for admin users.
 """
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
-from app.database import get_db
+from app.database import read_session_maker
 from app.models import Admin
 from app.schemas import TokenData
 
@@ -24,11 +28,32 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-please-change-in-productio
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "43200"))  # 30 days
 
+# Event stream tokens: EventSource can only authenticate through the URL, which
+# ends up in access/proxy logs, so it gets a short-lived token that is valid
+# for nothing but opening the stream
+STREAM_TOKEN_EXPIRE_SECONDS = int(os.getenv("STREAM_TOKEN_EXPIRE_SECONDS", "60"))
+STREAM_TOKEN_SCOPE = "events"
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow (~100-300 ms per call); async code runs it on
+# this bounded pool so it never blocks the event loop, and at most
+# PASSWORD_HASH_WORKERS hashes run at once
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+_hash_executor = ThreadPoolExecutor(max_workers=max(PASSWORD_HASH_WORKERS, 1), thread_name_prefix="password-hash")
+
+# Concurrent login attempts allowed per username and per client IP
+LOGIN_MAX_CONCURRENT_PER_USER = int(os.getenv("LOGIN_MAX_CONCURRENT_PER_USER", "2"))
+LOGIN_MAX_CONCURRENT_PER_IP = int(os.getenv("LOGIN_MAX_CONCURRENT_PER_IP", "4"))
+
+# Verified admins by token subject: username -> (detached Admin, cached_at)
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "60"))
+_admin_cache: Dict[str, Tuple[Admin, float]] = {}
+
 # HTTP Bearer scheme for token extraction
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -41,6 +66,78 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the hashing pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the hashing pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+
+def shutdown_password_hashing() -> None:
+    """Stop the hashing pool; pending hashes are cancelled."""
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LoginThrottle:
+    """
+    Caps in-flight login attempts per username and per client IP, so a
+    burst of guesses cannot queue up unbounded bcrypt work. Attempts over
+    either cap are rejected with 429 instead of waiting.
+    """
+
+    def __init__(self, max_per_user: int = 2, max_per_ip: int = 4):
+        self.max_per_user = max_per_user
+        self.max_per_ip = max_per_ip
+        self._users: Dict[str, int] = {}
+        self._ips: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def attempt(self, username: str, client_ip: Optional[str]) -> AsyncIterator[None]:
+        username = username.lower()
+        ip = client_ip or "unknown"
+        if (
+            (self.max_per_user > 0 and self._users.get(username, 0) >= self.max_per_user)
+            or (self.max_per_ip > 0 and self._ips.get(ip, 0) >= self.max_per_ip)
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many concurrent login attempts, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        self._users[username] = self._users.get(username, 0) + 1
+        self._ips[ip] = self._ips.get(ip, 0) + 1
+        try:
+            yield
+        finally:
+            self._release(self._users, username)
+            self._release(self._ips, ip)
+
+    @staticmethod
+    def _release(counters: Dict[str, int], key: str) -> None:
+        remaining = counters.get(key, 0) - 1
+        if remaining > 0:
+            counters[key] = remaining
+        else:
+            counters.pop(key, None)
+
+
+login_throttle = LoginThrottle(
+    max_per_user=LOGIN_MAX_CONCURRENT_PER_USER,
+    max_per_ip=LOGIN_MAX_CONCURRENT_PER_IP
+)
+
+
+def invalidate_admin_cache() -> None:
+    """Forget cached admins; call after changing an admin's username or password."""
+    _admin_cache.clear()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create JWT access token.
@@ -65,8 +162,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 async def get_current_admin(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> Admin:
     """
     Dependency to get current authenticated admin user.
@@ -77,18 +173,59 @@ async def get_current_admin(
         async def protected_route(admin: Admin = Depends(get_current_admin)):
             return {"message": f"Hello {admin.username}"}
     """
+    return await get_admin_from_token(credentials.credentials)
+
+
+def create_stream_token(admin: Admin) -> str:
+    """Short-lived token that only opens the event stream (see get_current_admin_for_stream)."""
+    return create_access_token(
+        data={"sub": admin.username, "scope": STREAM_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    )
+
+
+async def get_current_admin_for_stream(
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> Admin:
+    """
+    Like get_current_admin, but also accepts a stream token (create_stream_token)
+    as a `token` query parameter. For EventSource (SSE) clients, which cannot
+    send an Authorization header. Access tokens are never accepted in the URL.
+    """
+    if credentials is not None:
+        return await get_admin_from_token(credentials.credentials)
+    return await get_admin_from_token(token, scope=STREAM_TOKEN_SCOPE)
+
+
+async def get_admin_from_token(token: Optional[str], scope: Optional[str] = None) -> Admin:
+    """
+    Validate a JWT and load the admin it was issued for.
+    scope=None accepts access tokens only; a scoped token is only accepted
+    where that scope is asked for.
+
+    The admin is loaded in a short-lived session of its own, so the returned
+    (and cached) instance is detached: rollbacks in request sessions cannot
+    expire it. It is shared between requests; routes that modify or return
+    the admin load their own copy.
+
+    Raises:
+        HTTPException 401 if the token is missing, invalid or the admin is gone
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    if not token:
+        raise credentials_exception
+
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
 
-        if username is None:
+        if username is None or payload.get("scope") != scope:
             raise credentials_exception
 
         token_data = TokenData(username=username)
@@ -96,15 +233,24 @@ async def get_current_admin(
     except JWTError:
         raise credentials_exception
 
-    # Get admin from database
-    result = await db.execute(
-        select(Admin).where(Admin.username == token_data.username)
-    )
-    admin = result.scalar_one_or_none()
+    # Cached admin: no database work
+    cached = _admin_cache.get(token_data.username)
+    if cached is not None and time.monotonic() - cached[1] < ADMIN_CACHE_TTL:
+        return cached[0]
+
+    # Get admin from database; closing the session detaches the instance
+    async with read_session_maker() as session:
+        result = await session.execute(
+            select(Admin).where(Admin.username == token_data.username)
+        )
+        admin = result.scalar_one_or_none()
 
     if admin is None:
+        _admin_cache.pop(token_data.username, None)
         raise credentials_exception
 
+    if ADMIN_CACHE_TTL > 0:
+        _admin_cache[token_data.username] = (admin, time.monotonic())
     return admin
 
 
@@ -123,7 +269,7 @@ async def authenticate_admin(db: AsyncSession, username: str, password: str) ->
     if not admin:
         return None
 
-    if not verify_password(password, admin.password_hash):
+    if not await verify_password_async(password, admin.password_hash):
         return None
 
     return admin
@@ -1,9 +1,24 @@
 """
 Database configuration and session management.
 Using SQLAlchemy 2.0 async style.
+
+For a SQLite file the database runs in WAL mode with two engines:
+- writer: a single pooled connection, so writes are serialized in-process;
+  sessions wait their turn for it (up to DB_WRITE_TIMEOUT seconds) instead
+  of failing with "database is locked"
+- reader: a pool of read-only (query_only) connections; under WAL readers
+  see the last committed state and never wait for the writer
+
+get_db hands GET/HEAD requests a reader session and everything else a
+writer session. Writer sessions end their transaction before Core calls
+(release_connection) so the writer is never held across network I/O.
 """
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from typing import AsyncGenerator
 import os
 from dotenv import load_dotenv
@@ -12,14 +27,71 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./proxy_admin.db")
 
-# Create async engine
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,  # Set to True for SQL query logging during development
-    future=True,
-)
+# SQLite tuning, applied to every connection
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative = KiB, positive = pages
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", "134217728"))  # bytes, 0 = off
+
+# Read-only connections in the reader pool; seconds a session may wait for the writer
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+DB_WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "30"))
+
+# Requests served from the reader pool by get_db
+READ_ONLY_METHODS = {"GET", "HEAD"}
+
+if DB_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"DB_SYNCHRONOUS must be OFF, NORMAL, FULL or EXTRA, got '{DB_SYNCHRONOUS}'")
+
+_url = make_url(DATABASE_URL)
+_sqlite_file = _url.get_backend_name() == "sqlite" and _url.database not in (None, "", ":memory:")
+
+
+def _apply_pragmas(dbapi_connection, read_only: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    if not read_only:
+        # Persistent in the database file; readers pick it up from there
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
 
-# Create async session factory
+
+if _sqlite_file:
+    # Writer: one connection, sessions queue for it
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,  # Set to True for SQL query logging during development
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=DB_WRITE_TIMEOUT,
+    )
+    read_engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=max(DB_READ_POOL_SIZE, 1),
+        max_overflow=0,
+    )
+    event.listen(engine.sync_engine, "connect", lambda conn, record: _apply_pragmas(conn, read_only=False))
+    event.listen(read_engine.sync_engine, "connect", lambda conn, record: _apply_pragmas(conn, read_only=True))
+else:
+    # In-memory SQLite or another database: one engine for everything
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,  # Set to True for SQL query logging during development
+        future=True,
+    )
+    read_engine = engine
+
+# Create async session factories (writer and reader)
 async_session_maker = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -28,6 +100,14 @@ async_session_maker = async_sessionmaker(
     autoflush=False,
 )
 
+read_session_maker = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+)
+
 
 # Base class for all models
 class Base(DeclarativeBase):
@@ -35,12 +115,31 @@ class Base(DeclarativeBase):
 
 
 # Dependency for FastAPI routes
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency function that yields database sessions.
+    GET/HEAD requests get a read-only session, other methods a writer session.
     Usage: db: AsyncSession = Depends(get_db)
     """
-    async with async_session_maker() as session:
+    maker = read_session_maker if request.method in READ_ONLY_METHODS else async_session_maker
+    async for session in _session_scope(maker):
+        yield session
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Read-only session regardless of method (e.g. a POST that only reads)."""
+    async for session in _session_scope(read_session_maker):
+        yield session
+
+
+async def get_write_db() -> AsyncGenerator[AsyncSession, None]:
+    """Writer session regardless of method (e.g. a GET that creates a default row)."""
+    async for session in _session_scope(async_session_maker):
+        yield session
+
+
+async def _session_scope(maker: async_sessionmaker) -> AsyncGenerator[AsyncSession, None]:
+    async with maker() as session:
         try:
             yield session
             await session.commit()
@@ -58,3 +157,38 @@ async def init_database():
     """
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_database():
+    """Close all pooled connections. Call on application shutdown."""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+
+async def release_connection(session: AsyncSession) -> None:
+    """
+    End the session's transaction so its connection goes back to the pool;
+    the next query checks one out again. Pending changes are committed.
+
+    Call before slow I/O that needs no database (Core HTTP calls): a writer
+    session keeps the only writer connection until its transaction ends.
+    """
+    await session.commit()
+
+
+async def begin_immediate(session: AsyncSession) -> None:
+    """
+    Open a write transaction right away (SQLite BEGIN IMMEDIATE).
+
+    Use before a check-then-insert sequence: the write lock is taken before
+    the check, so no other connection can commit in between.
+    No-op if the session's connection already has a transaction open.
+    """
+    conn = await session.connection()
+    if conn.dialect.name != "sqlite":
+        return
+
+    raw = await conn.get_raw_connection()
+    if not raw.driver_connection.in_transaction:
+        await conn.exec_driver_sql("BEGIN IMMEDIATE")
@@ -2,7 +2,7 @@
 SQLAlchemy models for the proxy management system.
 All models include created_at and updated_at timestamps.
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, BigInteger
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON, BigInteger, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -124,6 +124,12 @@ class User(Base):
     outbound = relationship("Outbound", back_populates="users")
     rules = relationship("Rule", secondary="user_rules", back_populates="users")
 
+    __table_args__ = (
+        # Covers "enable AND expire_time > now" filters so status counts
+        # and inventory checks can be answered from the index alone
+        Index("ix_users_enable_expire_time", "enable", "expire_time"),
+    )
+
 
 class UserRule(Base):
     """
@@ -137,6 +143,11 @@ class UserRule(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        # Per-rule inventory aggregates group by rule and join to users
+        Index("ix_user_rules_rule_id_user_id", "rule_id", "user_id"),
+    )
+
 
 class SystemSettings(Base):
     """
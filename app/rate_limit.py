@@ -0,0 +1,133 @@
+"""
+Per-API-key rate limiting for the external API.
+Token bucket per key: capacity rate_limit_per_minute, refilled continuously.
+"""
+from typing import Dict, List, NamedTuple, Optional
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    tokens: float  # tokens left after this request
+    rate: float  # tokens per second
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(max(int(self.tokens), 0)),
+            "X-RateLimit-Reset": str(math.ceil((self.limit - self.tokens) / self.rate))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil((1 - self.tokens) / self.rate), 1))
+        return headers
+
+
+# One atomic statement: refill from elapsed time, then take a token if one is available.
+# SET expressions all see the row as it was before the update.
+_TAKE_SQL = """
+INSERT INTO buckets (key_id, tokens, updated, allowed) VALUES (:key_id, :capacity - 1, :now, 1)
+ON CONFLICT(key_id) DO UPDATE SET
+    allowed = (min(:capacity, tokens + max(0.0, :now - updated) * :rate) >= 1),
+    tokens = min(:capacity, tokens + max(0.0, :now - updated) * :rate)
+             - (min(:capacity, tokens + max(0.0, :now - updated) * :rate) >= 1),
+    updated = max(updated, :now)
+RETURNING tokens, allowed
+"""
+
+
+class _SharedStore:
+    """The shared backend's SQLite connection, used by one thread at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = asyncio.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def take(self, key_id: int, capacity: int, rate: float, now: float) -> tuple:
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=OFF")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    "key_id INTEGER PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL)"
+                )
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self.conn = conn
+        return self.conn.execute(
+            _TAKE_SQL, {"key_id": key_id, "capacity": capacity, "rate": rate, "now": now}
+        ).fetchone()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by API key ID; each bucket is two numbers
+    (tokens, last refill time).
+
+    Backends:
+    - in-process (state_file empty): a dict updated synchronously on the
+      event loop, so no locking is needed; each uvicorn worker limits on
+      its own
+    - shared (state_file set): buckets live in a small SQLite file that
+      all workers on the host use; a request is one atomic UPSERT run in
+      a worker thread. SQLite allows one writer at a time, so each worker
+      uses a single connection and updates from all workers are serialized
+      by the file lock. If the lock is not free within the busy timeout the
+      request is let through (fail open) and a warning is logged.
+    """
+
+    def __init__(self, state_file: str = ""):
+        self.state_file = state_file
+        self._buckets: Dict[int, List[float]] = {}  # key_id -> [tokens, updated]
+        self._store = _SharedStore(state_file) if state_file else None
+
+    async def take(self, key_id: int, limit_per_minute: int) -> RateLimitResult:
+        """Take one token from the key's bucket."""
+        capacity = max(limit_per_minute, 1)
+        rate = capacity / 60.0
+
+        if self._store is not None:
+            try:
+                async with self._store.lock:
+                    tokens, allowed = await asyncio.to_thread(self._store.take, key_id, capacity, rate, time.time())
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Rate limit state unavailable, allowing request for key {key_id}: {str(e)}")
+                return RateLimitResult(True, capacity, capacity - 1.0, rate)
+            return RateLimitResult(bool(allowed), capacity, tokens, rate)
+
+        now = time.monotonic()
+        bucket = self._buckets.get(key_id)
+        if bucket is None:
+            bucket = self._buckets[key_id] = [float(capacity), now]
+
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        bucket[0], bucket[1] = tokens, now
+        return RateLimitResult(allowed, capacity, tokens, rate)
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+
+
+rate_limiter = TokenBucketLimiter(
+    state_file=os.getenv("API_RATE_LIMIT_STATE_FILE", "")
+)
@@ -2,13 +2,13 @@
 Authentication routes.
 Handles login and token generation.
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from app.database import get_db
+from app.database import get_read_db
 from app.schemas import LoginRequest, Token
-from app.auth import authenticate_admin, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.auth import authenticate_admin, create_access_token, login_throttle, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
@@ -16,13 +16,17 @@ router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 @router.post("/login", response_model=Token)
 async def login(
     login_data: LoginRequest,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Admin login endpoint.
     Returns JWT token on successful authentication.
+    Too many concurrent attempts for one username or client IP get 429.
     """
-    admin = await authenticate_admin(db, login_data.username, login_data.password)
+    client_ip = request.client.host if request.client else None
+    async with login_throttle.attempt(login_data.username, client_ip):
+        admin = await authenticate_admin(db, login_data.username, login_data.password)
 
     if not admin:
         raise HTTPException(
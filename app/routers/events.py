@@ -0,0 +1,81 @@
+"""
+Live event stream (Server-Sent Events).
+Pushes compact user, inventory and dashboard changes so clients can patch
+local state instead of re-fetching whole lists.
+"""
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+
+from app.models import Admin
+from app.auth import (
+    create_stream_token,
+    get_current_admin,
+    get_current_admin_for_stream,
+    STREAM_TOKEN_EXPIRE_SECONDS
+)
+from app.services.event_bus import event_bus, RESYNC
+
+router = APIRouter(prefix="/api/events", tags=["Events"])
+
+# Comment line sent when idle so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+
+
+@router.post("/token")
+async def create_event_stream_token(
+    admin: Admin = Depends(get_current_admin)
+):
+    """
+    Issue a short-lived token for opening the event stream with EventSource.
+    It is only checked when the stream is opened; reconnects need a new one.
+    """
+    return {"token": create_stream_token(admin), "expires_in": STREAM_TOKEN_EXPIRE_SECONDS}
+
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
+    last_event_id_param: Optional[int] = Query(None, alias="last_event_id"),
+    admin: Admin = Depends(get_current_admin_for_stream)
+):
+    """
+    Subscribe to change events (text/event-stream).
+
+    Authenticate with the usual Bearer header or `?token=<stream token>` from
+    POST /api/events/token (EventSource). Resume with the Last-Event-ID header
+    or `?last_event_id=`.
+    Events: user.created, user.updated, user.deleted, inventory, dashboard.
+    A `resync` event means events were missed: reload lists and reconnect.
+    """
+    queue = event_bus.subscribe(last_event_id if last_event_id is not None else last_event_id_param)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+
+                if frame is RESYNC:
+                    yield "event: resync\ndata: {}\n\n"
+                    break
+                yield frame
+        finally:
+            event_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
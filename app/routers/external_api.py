@@ -18,6 +18,8 @@ from app.schemas import (
 )
 from app.api_key_auth import verify_api_key, require_permission
 from app.services.user_service import UserService
+from app.services.occupancy import occupancy
+from app.services.event_bus import event_bus
 from app.core_client import CoreAdapter
 
 router = APIRouter(prefix="/api/external", tags=["External API"])
@@ -78,9 +80,13 @@ async def provision_user(
         enable=True
     )
 
-    # Use UserService to create user (handles Core sync)
+    # Use UserService to create user (handles Core sync).
+    # Capacity and per-game uniqueness are checked atomically with the insert.
     user_service = UserService(db, core)
-    user = await user_service.create(user_data)
+    try:
+        user = await user_service.create(user_data, check_capacity=True)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
     return user
 
@@ -128,7 +134,10 @@ async def renew_user(
         total_traffic=new_total_traffic,
         enable=True  # Re-enable if disabled
     )
-    user = await user_service.update(user.id, update_data)
+    try:
+        user = await user_service.update(user.id, update_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
     return user
 
@@ -352,7 +361,10 @@ async def toggle_user_by_port(
         raise HTTPException(status_code=404, detail=f"User with port {port} not found")
 
     user_service = UserService(db, core)
-    user = await user_service.toggle_enable(user.id)
+    try:
+        user = await user_service.toggle_enable(user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
     return user
 
@@ -408,6 +420,9 @@ async def payment_webhook(
                 user.enable = False
                 user.status = "disabled"
                 await db.commit()
+                occupancy.update_user(user.id, user.outbound_id, user.enable, user.expire_time)
+                event_bus.publish_users("user.updated", [user])
+                event_bus.publish_inventory(occupancy.user_rule_ids(user.id))
 
     return SuccessResponse(message="Webhook processed successfully")
 
@@ -2,15 +2,18 @@
 Game Inventory API Routes
 Provides endpoints for checking IP availability for each game.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.auth import get_current_admin
 from app.models import Admin
 from app.services.game_inventory_service import GameInventoryService
-from app.schemas import GameInventoryResponse, GameInventory
+from app.schemas import (
+    GameInventoryResponse, GameInventory, OutboundResponse, OutboundUsage,
+    CapacityForecastResponse
+)
 
 router = APIRouter(
     prefix="/api/game-inventory",
@@ -28,18 +31,39 @@ async def get_all_inventories(
     Shows available IPs for each game/rule.
     """
     service = GameInventoryService(db)
-    inventories = await service.get_all_game_inventories()
+    return await service.get_inventory_overview()
 
-    # Get total outbounds from first inventory or query
-    from sqlalchemy import select, func
-    from app.models import Outbound
-    result = await db.execute(select(func.count(Outbound.id)))
-    total_outbounds = result.scalar() or 0
 
-    return {
-        "games": inventories,
-        "total_outbounds": total_outbounds
-    }
+@router.get("/forecast", response_model=CapacityForecastResponse)
+async def get_capacity_forecast(
+    days: int = Query(7, ge=1, le=90),
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin)
+):
+    """
+    Forecast how many IPs free up for each game per day over the next `days` days,
+    based on when active users expire.
+    """
+    service = GameInventoryService(db)
+    return await service.get_capacity_forecast(days)
+
+
+@router.get("/outbounds/usage", response_model=List[OutboundUsage])
+async def get_all_outbound_usage(
+    has_free_slots: bool = False,
+    free_for_rule_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin)
+):
+    """
+    Get usage information for all outbounds/IPs in one call.
+
+    Filters:
+    - has_free_slots: only IPs with remaining slots
+    - free_for_rule_id: only IPs that can take a new user for this game
+    """
+    service = GameInventoryService(db)
+    return await service.get_all_outbound_usage(has_free_slots, free_for_rule_id)
 
 
 @router.get("/{rule_id}", response_model=GameInventory)
@@ -69,6 +93,39 @@ async def get_game_inventory(
     }
 
 
+@router.get("/{rule_id}/available-outbounds", response_model=List[OutboundResponse])
+async def get_available_outbounds(
+    rule_id: int,
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin)
+):
+    """
+    Get outbounds (IPs) that can take a new user for a specific game/rule.
+    """
+    service = GameInventoryService(db)
+    return await service.get_available_outbounds_for_game(rule_id, limit)
+
+
+@router.get("/{rule_id}/placement", response_model=List[OutboundResponse])
+async def preview_placement(
+    rule_id: int,
+    count: int = Query(1, ge=1, le=100),
+    strategy: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin)
+):
+    """
+    Preview which outbounds `count` new users of a game would be placed on.
+    strategy: least_loaded, round_robin, spread or bin_pack (default from PLACEMENT_STRATEGY)
+    """
+    service = GameInventoryService(db)
+    try:
+        return await service.choose_outbounds_for_game(rule_id, count, strategy, preview=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/outbound/{outbound_id}/usage")
 async def get_outbound_usage(
     outbound_id: int,
@@ -1,17 +1,18 @@
 """
 Outbound management routes.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 import os
 
 from app.database import get_db
 from app.models import Admin
 from app.auth import get_current_admin
-from app.schemas import OutboundCreate, OutboundUpdate, OutboundResponse, SuccessResponse
+from app.schemas import OutboundCreate, OutboundUpdate, OutboundResponse, OutboundWithStats, OutboundHealth, SuccessResponse
 from app.services.outbound_service import OutboundService
 from app.core_client import CoreAdapter
+from app.services.health_prober import health_prober
 
 router = APIRouter(prefix="/api/outbounds", tags=["Outbounds"])
 
@@ -24,18 +25,57 @@ def get_core_adapter() -> CoreAdapter:
     )
 
 
-@router.get("", response_model=List[OutboundResponse])
+@router.get("", response_model=List[OutboundWithStats], response_model_exclude_unset=True)
 async def get_all_outbounds(
+    with_stats: bool = False,
+    sort: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
     db: AsyncSession = Depends(get_db),
     admin: Admin = Depends(get_current_admin),
     core: CoreAdapter = Depends(get_core_adapter)
 ):
-    """Get all outbound configurations."""
+    """
+    Get all outbound configurations.
+
+    with_stats=true adds active_user_count, available_slots, game_count and
+    load (active / max_users) per outbound, computed in one grouped query.
+    sort (load, active, free, games, name; implies with_stats) orders the
+    list server-side, `order` asc/desc.
+    """
     service = OutboundService(db, core)
+
+    if with_stats or sort is not None:
+        try:
+            return await service.get_all_with_stats(sort, descending=order == "desc")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     outbounds = await service.get_all()
     return outbounds
 
 
+@router.get("/health", response_model=List[OutboundHealth])
+async def get_outbounds_health(
+    probe: bool = False,
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """
+    Rolling latency and availability stats per outbound.
+    probe=true runs a probe cycle first instead of waiting for the next one.
+    Unhealthy outbounds are skipped when placing new game users.
+    """
+    if probe:
+        await health_prober.probe_once(core)
+    service = OutboundService(db, core)
+    outbounds = await service.get_all()
+    return [
+        OutboundHealth(name=outbound.name, **health_prober.get_stats(outbound.id))
+        for outbound in outbounds
+    ]
+
+
 @router.get("/{outbound_id}", response_model=OutboundResponse)
 async def get_outbound(
     outbound_id: int,
@@ -106,6 +146,7 @@ async def delete_outbound(
 
 @router.post("/scan", response_model=SuccessResponse)
 async def scan_local_interfaces(
+    prune: bool = False,
     db: AsyncSession = Depends(get_db),
     admin: Admin = Depends(get_current_admin),
     core: CoreAdapter = Depends(get_core_adapter)
@@ -113,14 +154,52 @@ async def scan_local_interfaces(
     """
     One-click scan: Automatically create outbounds for all local network interfaces.
     This is a key feature for quickly setting up direct outbounds.
+
+    prune=true also removes auto-generated outbounds whose interface is gone
+    (outbounds that still have users are kept).
     """
     service = OutboundService(db, core)
 
     try:
-        outbounds = await service.scan_local_interfaces()
+        result = await service.scan_local_interfaces(prune=prune)
+        message = f"Successfully scanned and created {len(result['created'])} outbounds"
+        if prune:
+            message += f", pruned {len(result['pruned'])}"
+            if result["kept_in_use"]:
+                message += f" ({len(result['kept_in_use'])} stale outbounds still in use were kept)"
         return SuccessResponse(
-            message=f"Successfully scanned and created {len(outbounds)} outbounds",
-            data={"count": len(outbounds)}
+            message=message,
+            data={
+                "count": len(result["created"]),
+                "pruned": result["pruned"],
+                "kept_in_use": result["kept_in_use"]
+            }
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/{outbound_id}/drain", response_model=SuccessResponse)
+async def drain_outbound(
+    outbound_id: int,
+    partial: bool = False,
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """
+    Move all active users off an outbound (e.g. an IP blocked by a game)
+    to other outbounds with free slots that are not yet used for the users'
+    games. partial=true moves what fits instead of refusing the drain.
+    """
+    service = OutboundService(db, core)
+
+    try:
+        result = await service.drain(outbound_id, partial=partial)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    message = f"Moved {len(result['moved'])} users"
+    if result["unplaced"]:
+        message += f", {len(result['unplaced'])} could not be placed"
+    return SuccessResponse(message=message, data=result)
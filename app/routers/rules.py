@@ -1,16 +1,18 @@
 """
 Rule management routes.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+from datetime import datetime
 import os
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models import Admin
 from app.auth import get_current_admin
-from app.schemas import RuleCreate, RuleUpdate, RuleResponse
-from app.services.rule_service import RuleService
+from app.schemas import RuleCreate, RuleUpdate, RuleResponse, RuleImportRequest, RuleTestRequest, RuleTestResponse, SuccessResponse
+from app.services.rule_service import RuleService, parse_rules_csv, rules_to_csv
 from app.core_client import CoreAdapter
 
 router = APIRouter(prefix="/api/rules", tags=["Rules"])
@@ -36,6 +38,104 @@ async def get_all_rules(
     return rules
 
 
+@router.get("/export")
+async def export_rules(
+    format: str = Query("json", pattern="^(json|csv)$"),
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """
+    Export all rules as a JSON list of RuleCreate objects or as CSV
+    (name, content, priority, remark). Both can be fed back to /import.
+    """
+    service = RuleService(db, core)
+    rules = await service.get_all()
+
+    if format == "csv":
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return Response(
+            content=rules_to_csv(rules),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="rules_{timestamp}.csv"'}
+        )
+
+    return [
+        RuleCreate(name=rule.name, content=rule.content, priority=rule.priority, remark=rule.remark)
+        for rule in rules
+    ]
+
+
+@router.post("/import", response_model=SuccessResponse)
+async def import_rules(
+    import_data: RuleImportRequest,
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """
+    Bulk upsert rules by name in one transaction with one Core addRules call.
+    mode=replace also deletes rules missing from the list and reloads Core
+    with deleteRuleAll + addRules.
+    """
+    service = RuleService(db, core)
+
+    try:
+        result = await service.bulk_import(import_data.rules, replace=import_data.mode == "replace")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return SuccessResponse(
+        message=f"Imported rules: {result['created']} created, {result['updated']} updated, {result['deleted']} deleted",
+        data=result
+    )
+
+
+@router.post("/import/csv", response_model=SuccessResponse)
+async def import_rules_csv(
+    file: UploadFile = File(...),
+    mode: str = Query("merge", pattern="^(merge|replace)$"),
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """Bulk rule import from a CSV upload; same semantics as /import."""
+    service = RuleService(db, core)
+
+    try:
+        rules = parse_rules_csv((await file.read()).decode("utf-8-sig"))
+        result = await service.bulk_import(rules, replace=mode == "replace")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return SuccessResponse(
+        message=f"Imported rules: {result['created']} created, {result['updated']} updated, {result['deleted']} deleted",
+        data=result
+    )
+
+
+@router.post("/test", response_model=RuleTestResponse)
+async def test_rules(
+    test_data: RuleTestRequest,
+    db: AsyncSession = Depends(get_read_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """
+    Show which rule entry decides each host[:port] target for a user's
+    assigned rules (user_id) or a set of rules (rule_ids).
+    Compiled matchers are cached per rule set and rebuilt when a rule changes.
+    """
+    service = RuleService(db, core)
+
+    try:
+        return await service.test_targets(test_data.targets, test_data.user_id, test_data.rule_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/{rule_id}", response_model=RuleResponse)
 async def get_rule(
     rule_id: int,
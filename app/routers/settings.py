@@ -5,7 +5,7 @@ Manages system-wide default settings.
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_db, get_write_db
 from app.auth import get_current_admin
 from app.models import Admin
 from app.services.settings_service import SettingsService
@@ -19,11 +19,12 @@ router = APIRouter(
 
 @router.get("/", response_model=SystemSettingsResponse)
 async def get_system_settings(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     admin: Admin = Depends(get_current_admin)
 ):
     """
     Get current system settings.
+    Writer session: the defaults row is created on first read.
     """
     service = SettingsService(db)
     settings = await service.get_settings()
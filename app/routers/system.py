@@ -3,15 +3,17 @@ System management routes.
 Handles dashboard stats, database backup, and admin settings.
 """
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 import os
 
 from app.database import get_db
 from app.models import Admin
-from app.auth import get_current_admin, get_password_hash
+from app.auth import get_current_admin, get_password_hash_async, invalidate_admin_cache
 from app.schemas import DashboardStats, AdminUpdate, AdminResponse, SuccessResponse
 from app.services.system_service import SystemService
+from app.services.backup_service import create_temp_snapshot, iter_gzip_file
+from app.services.core_resync import core_resync
 from app.core_client import CoreAdapter
 
 router = APIRouter(prefix="/api/system", tags=["System"])
@@ -42,29 +44,27 @@ async def get_dashboard_stats(
 
 @router.get("/backup")
 async def backup_database(
-    db: AsyncSession = Depends(get_db),
-    admin: Admin = Depends(get_current_admin),
-    core: CoreAdapter = Depends(get_core_adapter)
+    admin: Admin = Depends(get_current_admin)
 ):
     """
     Download database backup.
-    Returns the SQLite database file for download.
+    Takes a consistent online snapshot (SQLite backup API) in a worker thread
+    and streams it gzip-compressed in chunks.
     """
-    service = SystemService(db, core)
-    db_path = await service.get_database_path()
-
-    if not os.path.exists(db_path):
+    try:
+        snapshot_path = await create_temp_snapshot()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Database file not found")
 
     # Generate filename with timestamp
     from datetime import datetime
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"proxy_admin_backup_{timestamp}.db"
+    filename = f"proxy_admin_backup_{timestamp}.db.gz"
 
-    return FileResponse(
-        path=db_path,
-        filename=filename,
-        media_type="application/octet-stream"
+    return StreamingResponse(
+        iter_gzip_file(snapshot_path, remove=True),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 
@@ -105,12 +105,27 @@ async def check_expired_users(
     )
 
 
+@router.get("/resync-jobs")
+async def get_resync_jobs(
+    admin: Admin = Depends(get_current_admin)
+):
+    """
+    Recent Core re-sync jobs (users re-pushed after an outbound or rule
+    rename), newest first. Live progress is also sent as `core.resync` events.
+    """
+    return core_resync.get_jobs()
+
+
 @router.get("/admin/profile", response_model=AdminResponse)
 async def get_admin_profile(
+    db: AsyncSession = Depends(get_db),
     admin: Admin = Depends(get_current_admin)
 ):
     """Get current admin profile."""
-    return admin
+    profile = await db.get(Admin, admin.id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Admin not found")
+    return profile
 
 
 @router.put("/admin/profile", response_model=AdminResponse)
@@ -122,17 +137,23 @@ async def update_admin_profile(
     """
     Update admin profile (username, password, avatar).
     """
+    # The authenticated admin is a shared cached instance; edit a session copy
+    admin = await db.get(Admin, admin.id)
+    if admin is None:
+        raise HTTPException(status_code=404, detail="Admin not found")
+
     # Update fields
     if admin_data.username is not None:
         admin.username = admin_data.username
 
     if admin_data.password is not None:
-        admin.password_hash = get_password_hash(admin_data.password)
+        admin.password_hash = await get_password_hash_async(admin_data.password)
 
     if admin_data.avatar is not None:
         admin.avatar = admin_data.avatar
 
     await db.commit()
+    invalidate_admin_cache()
     await db.refresh(admin)
 
     return admin
@@ -10,8 +10,9 @@ from datetime import datetime
 from app.database import get_db
 from app.models import Admin
 from app.auth import get_current_admin
-from app.schemas import UserCreate, UserUpdate, UserResponse
+from app.schemas import UserCreate, UserUpdate, UserResponse, UserOnlineStatus, QuickUserCreate
 from app.services.user_service import UserService
+from app.services.online_tracker import online_tracker
 from app.core_client import CoreAdapter
 import os
 
@@ -55,6 +56,26 @@ async def get_user(
     return user
 
 
+@router.get("/{user_id}/online", response_model=UserOnlineStatus)
+async def get_user_online_status(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """
+    Get user online status and connection count.
+    Served from the background collector, does not query the Core.
+    """
+    service = UserService(db, core)
+    user = await service.get_by_id(user_id)
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return {"user_id": user.id, **online_tracker.get_port_status(user.port)}
+
+
 @router.post("", response_model=UserResponse, status_code=201)
 async def create_user(
     user_data: UserCreate,
@@ -72,6 +93,26 @@ async def create_user(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/quick-create", response_model=List[UserResponse], status_code=201)
+async def quick_create_users(
+    quick_data: QuickUserCreate,
+    db: AsyncSession = Depends(get_db),
+    admin: Admin = Depends(get_current_admin),
+    core: CoreAdapter = Depends(get_core_adapter)
+):
+    """
+    Create multiple users for a game in one request.
+    Outbounds, ports and credentials are assigned by the server; all-or-nothing.
+    """
+    service = UserService(db, core)
+
+    try:
+        users = await service.quick_create(quick_data)
+        return users
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: int,
@@ -132,12 +173,15 @@ async def toggle_enable(
 ):
     """Toggle user enable/disable status."""
     service = UserService(db, core)
+    if not await service.get_by_id(user_id):
+        raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
 
     try:
         user = await service.toggle_enable(user_id)
         return user
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        # Re-enabling onto a full outbound
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/{user_id}/renew", response_model=UserResponse)
@@ -150,9 +194,12 @@ async def renew_user(
 ):
     """Renew user expiration time."""
     service = UserService(db, core)
+    if not await service.get_by_id(user_id):
+        raise HTTPException(status_code=404, detail=f"User with ID {user_id} not found")
 
     try:
         user = await service.renew_user(user_id, new_expire_time)
         return user
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        # Reactivating onto a full outbound
+        raise HTTPException(status_code=400, detail=str(e))
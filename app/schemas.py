@@ -3,7 +3,7 @@ Pydantic schemas for request/response validation.
 """
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
 
 
 # ===========================
@@ -73,6 +73,23 @@ class OutboundWithStats(OutboundResponse):
     """Outbound with usage statistics"""
     active_user_count: int = 0  # Number of active users using this IP
     available_slots: int = 0  # Remaining slots (max_users - active_user_count)
+    game_count: int = 0  # Distinct games (rules) this IP is used for by active users
+    load: float = 0.0  # active_user_count / max_users
+
+
+class OutboundHealth(BaseModel):
+    """Rolling probe stats for an outbound"""
+    outbound_id: int
+    name: str
+    healthy: bool
+    availability: Optional[float] = None  # Share of successful probes in the window
+    avg_latency_ms: Optional[float] = None
+    p95_latency_ms: Optional[float] = None
+    last_latency_ms: Optional[float] = None
+    last_checked_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    consecutive_failures: int = 0
+    samples: int = 0
 
 
 # ===========================
@@ -96,6 +113,38 @@ class RuleUpdate(BaseModel):
     remark: Optional[str] = None
 
 
+class RuleImportRequest(BaseModel):
+    """Bulk rule import; mode=replace makes the list the complete rule set"""
+    rules: List[RuleCreate]
+    mode: str = Field(default="merge", pattern="^(merge|replace)$")
+
+
+class RuleTestRequest(BaseModel):
+    """Targets (host or host:port) to evaluate against a user's rules or explicit rule IDs"""
+    targets: List[str] = Field(..., min_length=1, max_length=10000)
+    user_id: Optional[int] = None
+    rule_ids: Optional[List[int]] = None
+
+
+class RuleTestResult(BaseModel):
+    target: str
+    host: str
+    port: Optional[int] = None
+    allowed: bool  # False when no rule entry matches
+    rule_id: Optional[int] = None
+    rule_name: Optional[str] = None
+    line: Optional[int] = None  # Matching line within the rule content
+    pattern: Optional[str] = None
+
+
+class RuleTestResponse(BaseModel):
+    rules: List[str]  # Evaluated rules in priority order
+    entries: int
+    warnings: List[str] = []  # Rule lines that could not be parsed
+    elapsed_ms: float
+    results: List[RuleTestResult]
+
+
 class RuleResponse(RuleBase):
     id: int
     priority: int
@@ -176,6 +225,15 @@ class UserResponse(UserBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserOnlineStatus(BaseModel):
+    """Online state of a user from the connection-list collector"""
+    user_id: int
+    port: int
+    online: bool
+    connection_count: int
+    checked_at: Optional[datetime] = None
+
+
 # ===========================
 # Authentication Schemas
 # ===========================
@@ -207,6 +265,9 @@ class DashboardStats(BaseModel):
     bandwidth_down: int
     online_users: int
     total_users: int
+    active_users: int = 0
+    expired_users: int = 0
+    disabled_users: int = 0
     system_version: str
     uptime: str
 
@@ -274,12 +335,58 @@ class GameInventoryResponse(BaseModel):
     total_outbounds: int
 
 
+class ForecastDay(BaseModel):
+    """IPs freed for a game on one day of the forecast"""
+    day: date
+    freed_ips: int  # IPs released for the game during this day
+    available_ips: int  # Available IPs at the end of this day (no new sales assumed)
+
+
+class GameCapacityForecast(BaseModel):
+    """Availability timeline for a game"""
+    rule_id: int
+    rule_name: str
+    used_ips: int
+    available_ips: int  # Available now
+    timeline: List[ForecastDay]
+
+
+class CapacityForecastResponse(BaseModel):
+    """Capacity forecast for all games"""
+    days: int
+    generated_at: datetime
+    total_outbounds: int
+    games: List[GameCapacityForecast]
+
+
+class OutboundGameUsage(BaseModel):
+    """Active users of one game on an outbound"""
+    rule_id: int
+    rule_name: str
+    user_count: int
+
+
+class OutboundUsage(BaseModel):
+    """Usage of an outbound (IP) with per-game breakdown"""
+    outbound_id: int
+    name: str
+    max_users: int
+    active_users: int
+    available_slots: int
+    games: List[OutboundGameUsage]
+
+
 class QuickUserCreate(BaseModel):
     """Quick user creation with game selection"""
     rule_id: int  # Selected game
     count: int = Field(default=1, ge=1, le=100)  # Number of users to create
     protocol: Optional[str] = None  # If None, use system default
-    expiration_days: Optional[int] = None  # If None, use system default
+    expiration_days: Optional[int] = Field(None, ge=1)  # If None, use system default
+    method: Optional[str] = None  # Shadowsocks encryption method, random if None
+    password: Optional[str] = None  # Shared password, generated per user if None
+    send_limit: Optional[int] = Field(None, ge=0)  # If None, use system default
+    receive_limit: Optional[int] = Field(None, ge=0)  # If None, use system default
+    strategy: Optional[str] = None  # Outbound placement strategy, PLACEMENT_STRATEGY if None
 
 
 # ===========================
@@ -0,0 +1,201 @@
+"""
+Backup Service
+Consistent online SQLite backups, gzip streaming and scheduled snapshots.
+"""
+from typing import Iterator, List, Optional
+from datetime import datetime
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import zlib
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_database_path() -> str:
+    """
+    Get the absolute path to the SQLite database file.
+    """
+    db_url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./proxy_admin.db")
+
+    # Extract file path from database URL
+    # Format: sqlite+aiosqlite:///./proxy_admin.db
+    if ":///" in db_url:
+        db_path = db_url.split("///")[1]
+    else:
+        db_path = "./proxy_admin.db"
+
+    return os.path.abspath(db_path)
+
+
+def snapshot_database(db_path: str, dest_path: str) -> None:
+    """
+    Copy the live database to dest_path with the SQLite online backup API.
+
+    The backup API reads through SQLite itself, so committed pages still in
+    the -wal file are included. All pages are copied in a single step under
+    one read transaction: under WAL writers keep going meanwhile, whereas a
+    stepwise backup restarts whenever the source is written between steps
+    and may never finish on a busy database.
+    Blocking - run it in a worker thread.
+    """
+    source = sqlite3.connect(db_path)
+    try:
+        dest = sqlite3.connect(dest_path)
+        try:
+            source.backup(dest, pages=-1)
+        finally:
+            dest.close()
+    finally:
+        source.close()
+
+
+def iter_gzip_file(path: str, remove: bool = False) -> Iterator[bytes]:
+    """
+    Yield a file gzip-compressed in chunks without loading it into memory.
+
+    Args:
+        path: File to compress
+        remove: Delete the file once it has been fully read
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+        yield compressor.flush()
+    finally:
+        if remove:
+            _remove_quietly(path)
+
+
+async def create_temp_snapshot() -> str:
+    """
+    Take a consistent snapshot into a temporary file in a worker thread.
+
+    Returns:
+        Path of the snapshot file; the caller is responsible for removing it
+    """
+    db_path = get_database_path()
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Database file not found: {db_path}")
+
+    fd, tmp_path = tempfile.mkstemp(prefix="proxy_admin_backup_", suffix=".db")
+    os.close(fd)
+
+    try:
+        await asyncio.to_thread(snapshot_database, db_path, tmp_path)
+    except Exception:
+        _remove_quietly(tmp_path)
+        raise
+
+    return tmp_path
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class BackupScheduler:
+    """
+    Periodically writes gzip-compressed snapshots to disk and keeps the newest N.
+    Disabled when interval_hours is 0.
+    """
+
+    FILE_PREFIX = "proxy_admin_"
+    FILE_SUFFIX = ".db.gz"
+
+    def __init__(self, backup_dir: str, interval_hours: float = 0, keep: int = 7):
+        self.backup_dir = backup_dir
+        self.interval_hours = interval_hours
+        self.keep = keep
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the scheduled backup task if enabled."""
+        if self.interval_hours <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the scheduled backup task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_hours * 3600)
+            try:
+                path = await self.run_once()
+                logger.info(f"Scheduled backup written to {path}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled backup failed: {str(e)}")
+
+    async def run_once(self) -> str:
+        """
+        Write one rotated snapshot.
+
+        Returns:
+            Path of the new backup file
+        """
+        tmp_path = await create_temp_snapshot()
+        try:
+            return await asyncio.to_thread(self._store, tmp_path)
+        finally:
+            _remove_quietly(tmp_path)
+
+    def list_backups(self) -> List[str]:
+        """Existing backup files, oldest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = sorted(
+            name for name in os.listdir(self.backup_dir)
+            if name.startswith(self.FILE_PREFIX) and name.endswith(self.FILE_SUFFIX)
+        )
+        return [os.path.join(self.backup_dir, name) for name in names]
+
+    def _store(self, snapshot_path: str) -> str:
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        final_path = os.path.join(self.backup_dir, f"{self.FILE_PREFIX}{timestamp}{self.FILE_SUFFIX}")
+        partial_path = final_path + ".part"
+
+        with open(snapshot_path, "rb") as src, gzip.open(partial_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(partial_path, final_path)
+
+        # Rotate: drop everything but the newest `keep` files
+        for old_path in self.list_backups()[:-self.keep]:
+            _remove_quietly(old_path)
+
+        return final_path
+
+
+backup_scheduler = BackupScheduler(
+    backup_dir=os.getenv("BACKUP_DIR", "./backups"),
+    interval_hours=float(os.getenv("BACKUP_INTERVAL_HOURS", "0")),
+    keep=max(1, int(os.getenv("BACKUP_KEEP", "7")))
+)
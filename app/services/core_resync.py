@@ -0,0 +1,195 @@
+"""
+Core Re-sync
+Re-pushes users to the Core after an edit changes something their Core
+payload references by name (outbound `out`, rule names in `rule`).
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from datetime import datetime, timezone
+import asyncio
+import logging
+import os
+
+from app.database import release_connection
+from app.models import User, Outbound, Rule, UserRule
+from app.core_client import CoreAdapter, CoreConnectionError
+from app.services.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+
+class ResyncJob:
+    """Progress of one re-sync fan-out."""
+
+    MAX_ERRORS = 10
+
+    def __init__(self, job_id: int, reason: str, total: int):
+        self.id = job_id
+        self.reason = reason
+        self.total = total
+        self.pushed = 0
+        self.failed = 0
+        self.errors: List[str] = []  # first MAX_ERRORS failures
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "reason": self.reason,
+            "total": self.total,
+            "pushed": self.pushed,
+            "failed": self.failed,
+            "errors": self.errors,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class CoreResyncManager:
+    """
+    Builds Core payloads for affected users in bulk (two queries
+    regardless of user count) and pushes them with editUser, `concurrency`
+    requests at a time.
+
+    Fan-outs up to `inline_limit` users finish before resync() returns;
+    larger ones continue in a background task. Progress is published as
+    `core.resync` events and kept for the last `keep_jobs` jobs.
+    """
+
+    def __init__(self, concurrency: int = 10, inline_limit: int = 100, keep_jobs: int = 20):
+        self.concurrency = concurrency
+        self.inline_limit = inline_limit
+        self.keep_jobs = keep_jobs
+
+        self._jobs: "OrderedDict[int, ResyncJob]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self._next_id = 1
+
+    def get_jobs(self) -> List[Dict]:
+        """Recent jobs, newest first."""
+        return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    async def load_payloads(self, db: AsyncSession, user_ids: Select) -> List[dict]:
+        """
+        Core payloads for the active users selected by `user_ids`
+        (a select of User.id), built without per-user queries.
+        """
+        from app.services.user_service import format_core_user_data
+
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            select(User, Outbound.name)
+            .join(Outbound, Outbound.id == User.outbound_id)
+            .where(
+                User.id.in_(user_ids.scalar_subquery()),
+                User.enable == True,
+                User.expire_time > now
+            )
+        )
+        rows = result.all()
+        if not rows:
+            return []
+
+        result = await db.execute(
+            select(UserRule.user_id, Rule.name)
+            .join(Rule, Rule.id == UserRule.rule_id)
+            .where(UserRule.user_id.in_(user_ids.scalar_subquery()))
+        )
+        rule_names: Dict[int, List[str]] = {}
+        for user_id, name in result.all():
+            rule_names.setdefault(user_id, []).append(name)
+
+        return [
+            format_core_user_data(user, outbound_name, rule_names.get(user.id, []))
+            for user, outbound_name in rows
+        ]
+
+    async def resync(
+        self,
+        db: AsyncSession,
+        reason: str,
+        user_ids: Select,
+        after: Optional[Callable[[ResyncJob, CoreAdapter], Awaitable[None]]] = None
+    ) -> ResyncJob:
+        """
+        Re-push the users selected by `user_ids`. Call after the change is
+        committed; the session's transaction is ended once the payloads are
+        loaded, so its connection is not held during the pushes. `after` runs
+        once all pushes finished (e.g. to delete the object under its old
+        name from Core).
+        """
+        payloads = await self.load_payloads(db, user_ids)
+        await release_connection(db)
+
+        job = ResyncJob(self._next_id, reason, len(payloads))
+        self._next_id += 1
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep_jobs:
+            self._jobs.popitem(last=False)
+
+        if len(payloads) <= self.inline_limit:
+            await self._run(job, payloads, after)
+        else:
+            logger.info(f"Core re-sync #{job.id} ({reason}): pushing {job.total} users in the background")
+            task = asyncio.create_task(self._run(job, payloads, after))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(
+        self,
+        job: ResyncJob,
+        payloads: List[dict],
+        after: Optional[Callable[[ResyncJob, CoreAdapter], Awaitable[None]]]
+    ) -> None:
+        # Own adapter: background jobs outlive the request that started them
+        core = CoreAdapter(
+            base_url=os.getenv("CORE_API_URL"),
+            api_key=os.getenv("CORE_API_KEY")
+        )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        report_every = max(1, job.total // 20)
+
+        async def push(payload: dict) -> None:
+            async with semaphore:
+                try:
+                    await core.edit_user(payload["listenAddr"], payload)
+                    job.pushed += 1
+                except CoreConnectionError as e:
+                    job.failed += 1
+                    if len(job.errors) < job.MAX_ERRORS:
+                        job.errors.append(f"{payload['listenAddr']}: {str(e)}")
+
+                if (job.pushed + job.failed) % report_every == 0:
+                    event_bus.publish("core.resync", job.to_dict())
+
+        try:
+            await asyncio.gather(*(push(payload) for payload in payloads))
+            if after is not None:
+                await after(job, core)
+        except Exception as e:
+            logger.error(f"Core re-sync #{job.id} ({job.reason}) failed: {str(e)}")
+        finally:
+            await core.close()
+            job.finished_at = datetime.now(timezone.utc)
+            event_bus.publish("core.resync", job.to_dict())
+
+        if job.failed:
+            logger.warning(f"Core re-sync #{job.id} ({job.reason}): {job.failed}/{job.total} users failed")
+
+    async def stop(self) -> None:
+        """Cancel background re-sync jobs."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+core_resync = CoreResyncManager(
+    concurrency=int(os.getenv("CORE_RESYNC_CONCURRENCY", "10")),
+    inline_limit=int(os.getenv("CORE_RESYNC_INLINE_LIMIT", "100"))
+)
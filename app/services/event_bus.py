@@ -0,0 +1,231 @@
+"""
+Event Bus
+In-process publisher for compact change events streamed to admin clients (SSE).
+Services publish after commit; each connected client gets its own bounded queue.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from datetime import date, datetime, timezone
+import asyncio
+import json
+import logging
+import os
+
+from app.database import read_session_maker
+from app.core_client import CoreAdapter
+from app.services.occupancy import occupancy
+
+logger = logging.getLogger(__name__)
+
+# Queued in place of events for a subscriber that fell too far behind
+RESYNC = object()
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class EventBus:
+    """
+    Fan-out of change events to SSE subscribers.
+
+    Event types:
+    - user.created / user.updated: {"users": [user summary, ...]}; a summary has
+      the user list columns, with outbound_id/rule_ids instead of nested objects,
+      so clients can insert or patch rows without re-fetching
+    - user.deleted: {"ids": [user_id, ...]}
+    - inventory: {"total_outbounds": int, "games": [{rule_id, used_ips, available_ips}, ...]}
+      (games is empty when only the outbound total changed)
+    - dashboard: dashboard stats sample, every `dashboard_interval` seconds while clients listen
+    - core.resync: progress of a Core re-sync job (see app.services.core_resync)
+
+    Every event is serialized once into an SSE frame shared by all subscribers.
+    A subscriber whose queue overflows gets a single RESYNC marker instead and
+    is expected to reload and reconnect. The last `history_size` frames are kept
+    so reconnecting clients can resume from Last-Event-ID.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 256,
+        history_size: int = 512,
+        dashboard_interval: float = 5.0
+    ):
+        self.queue_size = queue_size
+        self.dashboard_interval = dashboard_interval
+
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._history: Deque[Tuple[int, str]] = deque(maxlen=history_size)
+        self._sequence = 0
+
+        self._core: Optional[CoreAdapter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ===========================
+    # Subscriptions
+    # ===========================
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> asyncio.Queue:
+        """
+        Register a subscriber queue of SSE frames.
+
+        Args:
+            last_event_id: Resume after this event; replays missed frames if still
+                in history, otherwise the queue starts with RESYNC
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        if last_event_id is not None and last_event_id < self._sequence:
+            oldest = self._history[0][0] if self._history else self._sequence + 1
+            missed = [frame for event_id, frame in self._history if event_id > last_event_id]
+            if last_event_id + 1 < oldest or len(missed) > self.queue_size:
+                queue.put_nowait(RESYNC)
+            else:
+                for frame in missed:
+                    queue.put_nowait(frame)
+
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    # ===========================
+    # Publishing
+    # ===========================
+
+    def publish(self, event_type: str, data: Dict) -> None:
+        """Queue an event for all subscribers; never blocks."""
+        self._sequence += 1
+        payload = json.dumps(data, default=_json_default, separators=(",", ":"))
+        frame = f"id: {self._sequence}\nevent: {event_type}\ndata: {payload}\n\n"
+        self._history.append((self._sequence, frame))
+
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and ask it to reload
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    def publish_users(self, event_type: str, users: Iterable[Any]) -> None:
+        """Publish user.created / user.updated with compact user summaries."""
+        if not self._subscribers:
+            return
+        self.publish(event_type, {"users": [self._user_summary(user) for user in users]})
+
+    def publish_users_deleted(self, user_ids: List[int]) -> None:
+        if not self._subscribers:
+            return
+        self.publish("user.deleted", {"ids": list(user_ids)})
+
+    def publish_inventory(self, rule_ids: Iterable[int]) -> None:
+        """Publish the new inventory of the given games, read from the occupancy index."""
+        if not self._subscribers or not occupancy.ready:
+            return
+        rule_ids = sorted(set(rule_ids))
+        if not rule_ids:
+            return
+
+        total_outbounds = occupancy.total_outbounds()
+        games = []
+        for rule_id in rule_ids:
+            used_ips = occupancy.used_ips(rule_id)
+            games.append({
+                "rule_id": rule_id,
+                "used_ips": used_ips,
+                "available_ips": max(0, total_outbounds - used_ips)
+            })
+        self.publish("inventory", {"total_outbounds": total_outbounds, "games": games})
+
+    def publish_outbounds_changed(self) -> None:
+        """Publish the new outbound total; clients recompute available_ips = total - used_ips."""
+        if not self._subscribers or not occupancy.ready:
+            return
+        self.publish("inventory", {"total_outbounds": occupancy.total_outbounds(), "games": []})
+
+    @staticmethod
+    def _user_summary(user: Any) -> Dict:
+        return {
+            "id": user.id,
+            "port": user.port,
+            "username": user.username,
+            "password": user.password,
+            "protocol": user.protocol,
+            "enable": user.enable,
+            "status": user.status,
+            "expire_time": user.expire_time,
+            "outbound_id": user.outbound_id,
+            "rule_ids": sorted(occupancy.user_rule_ids(user.id)),
+            "total_traffic": user.total_traffic,
+            "up_traffic": user.up_traffic,
+            "down_traffic": user.down_traffic,
+            "send_limit": user.send_limit,
+            "receive_limit": user.receive_limit,
+            "max_conn_count": user.max_conn_count,
+            "email": user.email,
+            "remark": user.remark
+        }
+
+    # ===========================
+    # Dashboard Sampler
+    # ===========================
+
+    def start(self) -> None:
+        """Start the dashboard sampling task."""
+        if self.dashboard_interval > 0 and (self._task is None or self._task.done()):
+            self._core = CoreAdapter(
+                base_url=os.getenv("CORE_API_URL"),
+                api_key=os.getenv("CORE_API_KEY")
+            )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the dashboard sampling task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._core is not None:
+            await self._core.close()
+            self._core = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.dashboard_interval)
+            if not self._subscribers:
+                continue
+            try:
+                await self.sample_dashboard()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Dashboard sample failed: {str(e)}")
+
+    async def sample_dashboard(self) -> None:
+        """Collect one dashboard stats sample and publish it to all clients."""
+        # Imported here to avoid a cycle: system_service publishes events itself
+        from app.services.system_service import SystemService
+
+        async with read_session_maker() as session:
+            stats = await SystemService(session, self._core).get_dashboard_stats()
+        stats["sampled_at"] = datetime.now(timezone.utc)
+        self.publish("dashboard", stats)
+
+
+event_bus = EventBus(
+    queue_size=int(os.getenv("EVENT_QUEUE_SIZE", "256")),
+    dashboard_interval=float(os.getenv("DASHBOARD_EVENT_INTERVAL", "5"))
+)
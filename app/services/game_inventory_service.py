@@ -4,11 +4,26 @@ Calculates available IP slots for each game (rule).
 Core business logic for game-based IP management.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List, Dict, Optional
-from datetime import datetime, timezone
+from sqlalchemy import select, func, and_
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import os
+import time
 
 from app.models import User, Outbound, Rule, UserRule
+from app.services.occupancy import occupancy
+from app.services import placement
+
+# Forecasts are reused until users/outbounds change (occupancy version) or they age out
+FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", "300"))
+
+# days -> (occupancy version, monotonic build time, forecast)
+_forecast_cache: Dict[int, Tuple[int, float, Dict]] = {}
+
+
+def invalidate_forecast_cache() -> None:
+    """Drop cached capacity forecasts (rule changes are not tracked by the occupancy version)."""
+    _forecast_cache.clear()
 
 
 class GameInventoryService:
@@ -19,36 +34,87 @@ class GameInventoryService:
     - Each IP (outbound) can serve max N users (default 10)
     - Same IP cannot be used by 2 users for the same game (rule)
     - Only active users (enabled and not expired) count toward usage
+
+    Reads are answered from the in-memory occupancy index once it is built,
+    falling back to SQL aggregates otherwise.
     """
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, use_index: bool = True):
         self.db = db
+        self.use_index = use_index
 
-    async def get_all_game_inventories(self) -> List[Dict]:
+    async def get_inventory_overview(self) -> Dict:
         """
-        Calculate inventory for all games.
-        Returns list of {rule_id, rule_name, total_ips, available_ips, used_ips}
+        Calculate inventory for all games with two queries in total:
+        one outbound count and one grouped used-IP count over all rules.
+
+        Returns:
+            {"games": [{rule_id, rule_name, total_ips, available_ips, used_ips}, ...],
+             "total_outbounds": int}
         """
-        # Get all rules (games)
-        result = await self.db.execute(select(Rule))
-        rules = list(result.scalars().all())
+        if self.use_index and occupancy.ready:
+            result = await self.db.execute(select(Rule.id, Rule.name).order_by(Rule.id))
+            total_outbounds = occupancy.total_outbounds()
+            inventories = []
+            for rule_id, rule_name in result.all():
+                used_ips = occupancy.used_ips(rule_id)
+                inventories.append({
+                    "rule_id": rule_id,
+                    "rule_name": rule_name,
+                    "total_ips": total_outbounds,
+                    "available_ips": max(0, total_outbounds - used_ips),
+                    "used_ips": used_ips
+                })
+            return {
+                "games": inventories,
+                "total_outbounds": total_outbounds
+            }
 
         # Get total outbounds count
         result = await self.db.execute(select(func.count(Outbound.id)))
         total_outbounds = result.scalar() or 0
 
+        # Distinct outbounds used per rule by active users.
+        # Active-user conditions live in the join so rules without users still appear.
+        now = datetime.now(timezone.utc)
+        result = await self.db.execute(
+            select(Rule.id, Rule.name, func.count(func.distinct(User.outbound_id)))
+            .select_from(Rule)
+            .outerjoin(UserRule, UserRule.rule_id == Rule.id)
+            .outerjoin(
+                User,
+                and_(
+                    User.id == UserRule.user_id,
+                    User.enable == True,
+                    User.expire_time > now
+                )
+            )
+            .group_by(Rule.id, Rule.name)
+            .order_by(Rule.id)
+        )
+
         inventories = []
-        for rule in rules:
-            inventory = await self.get_game_inventory(rule.id)
+        for rule_id, rule_name, used_ips in result.all():
             inventories.append({
-                "rule_id": rule.id,
-                "rule_name": rule.name,
+                "rule_id": rule_id,
+                "rule_name": rule_name,
                 "total_ips": total_outbounds,
-                "available_ips": inventory["available_ips"],
-                "used_ips": inventory["used_ips"]
+                "available_ips": max(0, total_outbounds - used_ips),
+                "used_ips": used_ips
             })
 
-        return inventories
+        return {
+            "games": inventories,
+            "total_outbounds": total_outbounds
+        }
+
+    async def get_all_game_inventories(self) -> List[Dict]:
+        """
+        Calculate inventory for all games.
+        Returns list of {rule_id, rule_name, total_ips, available_ips, used_ips}
+        """
+        overview = await self.get_inventory_overview()
+        return overview["games"]
 
     async def get_game_inventory(self, rule_id: int) -> Dict:
         """
@@ -61,6 +127,15 @@ class GameInventoryService:
                 "available_ips": int  # Number of IPs available for this game
             }
         """
+        if self.use_index and occupancy.ready:
+            total_ips = occupancy.total_outbounds()
+            used_ips = occupancy.used_ips(rule_id)
+            return {
+                "total_ips": total_ips,
+                "used_ips": used_ips,
+                "available_ips": max(0, total_ips - used_ips)
+            }
+
         # Get total outbounds
         result = await self.db.execute(select(func.count(Outbound.id)))
         total_ips = result.scalar() or 0
@@ -104,14 +179,60 @@ class GameInventoryService:
         Returns:
             List of available Outbound objects
         """
+        if self.use_index and occupancy.ready:
+            outbound_ids = occupancy.available_outbound_ids(rule_id, limit)
+            if not outbound_ids:
+                return []
+            result = await self.db.execute(
+                select(Outbound)
+                .where(Outbound.id.in_(outbound_ids))
+                .order_by(Outbound.id)
+            )
+            return list(result.scalars().all())
+
+        query = self._available_outbounds_query(rule_id)
+        if limit:
+            query = query.limit(limit)
+
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    def _available_outbounds_query(self, rule_id: int):
+        """
+        Select available outbounds for a game with their active user count
+        (column "active_users"), ordered by ID.
+        """
         now = datetime.now(timezone.utc)
+        active_counts = self._active_counts_subquery(now)
+        active_users = func.coalesce(active_counts.c.active_users, 0)
+
+        return (
+            select(Outbound, active_users.label("active_users"))
+            .outerjoin(active_counts, active_counts.c.outbound_id == Outbound.id)
+            .where(
+                active_users < Outbound.max_users,
+                Outbound.id.not_in(self._used_for_game_query(rule_id, now))
+            )
+            .order_by(Outbound.id)
+        )
 
-        # Get all outbounds
-        result = await self.db.execute(select(Outbound))
-        all_outbounds = list(result.scalars().all())
+    @staticmethod
+    def _active_counts_subquery(now: datetime):
+        """Active users per outbound, one grouped count (columns outbound_id, active_users)."""
+        return (
+            select(User.outbound_id, func.count(User.id).label("active_users"))
+            .where(
+                User.enable == True,
+                User.expire_time > now
+            )
+            .group_by(User.outbound_id)
+            .subquery()
+        )
 
-        # Get outbounds already used for this game by active users
-        result = await self.db.execute(
+    @staticmethod
+    def _used_for_game_query(rule_id: int, now: datetime):
+        """Outbounds already used for a game by active users."""
+        return (
             select(User.outbound_id)
             .join(UserRule, User.id == UserRule.user_id)
             .where(
@@ -119,35 +240,51 @@ class GameInventoryService:
                 User.enable == True,
                 User.expire_time > now
             )
-            .distinct()
         )
-        used_outbound_ids = set(row[0] for row in result.all())
 
-        # Filter available outbounds
-        available = []
-        for outbound in all_outbounds:
-            # Check if this outbound is already used for this game
-            if outbound.id in used_outbound_ids:
-                continue
+    async def choose_outbounds_for_game(
+        self,
+        rule_id: int,
+        count: int,
+        strategy: Optional[str] = None,
+        preview: bool = False
+    ) -> List[Outbound]:
+        """
+        Choose `count` distinct outbounds for new users of a game using a
+        placement strategy (see app.services.placement).
+        preview=True leaves the round-robin cursor untouched.
 
-            # Check if outbound has available slots
-            result = await self.db.execute(
-                select(func.count(User.id))
-                .where(
-                    User.outbound_id == outbound.id,
-                    User.enable == True,
-                    User.expire_time > now
-                )
+        Returns:
+            Chosen Outbound objects in placement order (may be fewer than count)
+        """
+        if strategy is not None and strategy not in placement.STRATEGIES:
+            raise ValueError(
+                f"Unknown placement strategy '{strategy}'. Choose from: {', '.join(placement.STRATEGIES)}"
             )
-            current_users = result.scalar() or 0
-
-            if current_users < outbound.max_users:
-                available.append(outbound)
 
-                if limit and len(available) >= limit:
-                    break
-
-        return available
+        if self.use_index and occupancy.ready:
+            chosen_ids = occupancy.choose_outbounds(rule_id, count, strategy, advance=not preview)
+            if not chosen_ids:
+                return []
+            result = await self.db.execute(
+                select(Outbound).where(Outbound.id.in_(chosen_ids))
+            )
+            by_id = {outbound.id: outbound for outbound in result.scalars().all()}
+        else:
+            result = await self.db.execute(self._available_outbounds_query(rule_id))
+            by_id = {}
+            candidates = []
+            for outbound, active_users in result.all():
+                if occupancy.is_excluded(outbound.id):
+                    continue
+                by_id[outbound.id] = outbound
+                candidates.append(placement.PlacementCandidate(
+                    outbound.id, active_users, outbound.max_users,
+                    placement.placement_group(outbound.config, outbound.local_interface_ip)
+                ))
+            chosen_ids = placement.choose(candidates, count, strategy, rule_id, advance=not preview)
+
+        return [by_id[outbound_id] for outbound_id in chosen_ids if outbound_id in by_id]
 
     async def can_create_users_for_game(self, rule_id: int, count: int) -> tuple[bool, str]:
         """
@@ -218,3 +355,172 @@ class GameInventoryService:
             "available_slots": max(0, outbound.max_users - active_users),
             "games": games
         }
+
+    async def get_all_outbound_usage(
+        self,
+        has_free_slots: bool = False,
+        free_for_rule_id: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Get usage statistics for all outbounds with two grouped queries:
+        one for outbounds with their active user count, one for the
+        per-game breakdown of every outbound.
+
+        Args:
+            has_free_slots: Only outbounds with active users < max_users
+            free_for_rule_id: Only outbounds that can take a new user for this game
+
+        Returns:
+            List of get_outbound_usage() dicts (plus "name"), ordered by outbound ID
+        """
+        now = datetime.now(timezone.utc)
+        active_counts = self._active_counts_subquery(now)
+        active_users = func.coalesce(active_counts.c.active_users, 0)
+
+        query = (
+            select(Outbound.id, Outbound.name, Outbound.max_users, active_users)
+            .outerjoin(active_counts, active_counts.c.outbound_id == Outbound.id)
+            .order_by(Outbound.id)
+        )
+        if has_free_slots or free_for_rule_id is not None:
+            query = query.where(active_users < Outbound.max_users)
+        if free_for_rule_id is not None:
+            query = query.where(Outbound.id.not_in(self._used_for_game_query(free_for_rule_id, now)))
+
+        result = await self.db.execute(query)
+        usages = {}
+        for outbound_id, name, max_users, active in result.all():
+            usages[outbound_id] = {
+                "outbound_id": outbound_id,
+                "name": name,
+                "max_users": max_users,
+                "active_users": active,
+                "available_slots": max(0, max_users - active),
+                "games": []
+            }
+
+        if not usages:
+            return []
+
+        # Games breakdown for all outbounds at once
+        result = await self.db.execute(
+            select(User.outbound_id, Rule.id, Rule.name, func.count(User.id).label("user_count"))
+            .join(UserRule, UserRule.user_id == User.id)
+            .join(Rule, Rule.id == UserRule.rule_id)
+            .where(
+                User.enable == True,
+                User.expire_time > now
+            )
+            .group_by(User.outbound_id, Rule.id, Rule.name)
+            .order_by(User.outbound_id, Rule.id)
+        )
+        for outbound_id, rule_id, rule_name, user_count in result.all():
+            usage = usages.get(outbound_id)
+            if usage is not None:
+                usage["games"].append({
+                    "rule_id": rule_id,
+                    "rule_name": rule_name,
+                    "user_count": user_count
+                })
+
+        return list(usages.values())
+
+    async def get_capacity_forecast(self, days: int = 7) -> Dict:
+        """
+        Forecast how many IPs free up for each game over the next `days` days.
+
+        An IP is freed for a game when the last active user of that game on it
+        expires. One grouped query yields that release time per (rule, outbound);
+        a single pass over the releases sorted by time fills per-day buckets.
+        Results are cached until users or outbounds change.
+
+        Returns:
+            {"days": int, "generated_at": datetime, "total_outbounds": int,
+             "games": [{rule_id, rule_name, used_ips, available_ips,
+                        timeline: [{day, freed_ips, available_ips}, ...]}, ...]}
+        """
+        cached = _forecast_cache.get(days)
+        if (
+            cached is not None
+            and cached[0] == occupancy.version
+            and time.monotonic() - cached[1] < FORECAST_CACHE_TTL
+        ):
+            return cached[2]
+
+        version = occupancy.version
+        forecast = await self._build_capacity_forecast(days)
+        _forecast_cache[days] = (version, time.monotonic(), forecast)
+        return forecast
+
+    async def _build_capacity_forecast(self, days: int) -> Dict:
+        now = datetime.now(timezone.utc)
+
+        result = await self.db.execute(select(func.count(Outbound.id)))
+        total_outbounds = result.scalar() or 0
+
+        result = await self.db.execute(select(Rule.id, Rule.name).order_by(Rule.id))
+        games = {}
+        for rule_id, rule_name in result.all():
+            games[rule_id] = {
+                "rule_id": rule_id,
+                "rule_name": rule_name,
+                "used_ips": 0,
+                "freed": [0] * days
+            }
+
+        # When each (game, IP) pair is released: the latest expiry among its active users
+        release_time = func.max(User.expire_time).label("release_time")
+        result = await self.db.execute(
+            select(UserRule.rule_id, release_time)
+            .join(User, User.id == UserRule.user_id)
+            .where(
+                User.enable == True,
+                User.expire_time > now
+            )
+            .group_by(UserRule.rule_id, User.outbound_id)
+            .order_by(release_time)
+        )
+
+        horizon = now + timedelta(days=days)
+        for rule_id, released_at in result.all():
+            game = games.get(rule_id)
+            if game is None:
+                continue
+            game["used_ips"] += 1
+
+            # Stored datetimes are naive UTC
+            if released_at.tzinfo is None:
+                released_at = released_at.replace(tzinfo=timezone.utc)
+            if released_at > horizon:
+                continue
+            # Day 1 covers (now, now + 1 day], day 2 the next 24 hours, ...
+            day_index = max(0, -(-(released_at - now) // timedelta(days=1)) - 1)
+            game["freed"][day_index] += 1
+
+        day_dates = [(now + timedelta(days=i + 1)).date() for i in range(days)]
+        forecast_games = []
+        for game in games.values():
+            available_ips = max(0, total_outbounds - game["used_ips"])
+            timeline = []
+            running = available_ips
+            for day, freed_ips in zip(day_dates, game["freed"]):
+                running += freed_ips
+                timeline.append({
+                    "day": day,
+                    "freed_ips": freed_ips,
+                    "available_ips": running
+                })
+            forecast_games.append({
+                "rule_id": game["rule_id"],
+                "rule_name": game["rule_name"],
+                "used_ips": game["used_ips"],
+                "available_ips": available_ips,
+                "timeline": timeline
+            })
+
+        return {
+            "days": days,
+            "generated_at": now,
+            "total_outbounds": total_outbounds,
+            "games": forecast_games
+        }
@@ -0,0 +1,267 @@
+"""
+Outbound Health Prober
+Background checker that probes every outbound with bounded concurrency,
+keeps rolling latency/availability stats and keeps unhealthy outbounds
+out of game placement.
+"""
+from sqlalchemy import select
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, unquote
+import asyncio
+import logging
+import os
+import time
+
+from app.database import read_session_maker
+from app.models import Outbound
+from app.core_client import CoreAdapter, CoreConnectionError
+from app.services.occupancy import occupancy
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeSample(NamedTuple):
+    ok: bool
+    latency_ms: Optional[float]
+    checked_at: datetime
+
+
+class ProbeError(Exception):
+    """A probe step failed."""
+
+
+class OutboundHealthProber:
+    """
+    Probes all outbounds every `interval` seconds.
+
+    Each probe:
+    - asks the Core for the outbound (getOutBoundInfo)
+    - for proxy chains (config.proxyUrl), opens a TCP connection to the
+      upstream proxy and completes a SOCKS5 greeting/auth (or just the TCP
+      connect for HTTP proxies)
+
+    An outbound is unhealthy after `failure_threshold` consecutive failed
+    probes and healthy again after the next successful one. Outbounds that
+    were never probed count as healthy.
+    """
+
+    def __init__(
+        self,
+        interval: float = 60.0,
+        concurrency: int = 20,
+        timeout: float = 5.0,
+        window: int = 20,
+        failure_threshold: int = 3
+    ):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.window = window
+        self.failure_threshold = failure_threshold
+
+        self._samples: Dict[int, Deque[ProbeSample]] = {}
+        self._failures: Dict[int, int] = {}  # outbound_id -> consecutive failures
+        self._last_error: Dict[int, Optional[str]] = {}
+
+        self._core: Optional[CoreAdapter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_cycle_at: Optional[datetime] = None
+
+    # ===========================
+    # Read API
+    # ===========================
+
+    def is_healthy(self, outbound_id: int) -> bool:
+        return self._failures.get(outbound_id, 0) < self.failure_threshold
+
+    def unhealthy_ids(self) -> List[int]:
+        return [
+            outbound_id for outbound_id, failures in self._failures.items()
+            if failures >= self.failure_threshold
+        ]
+
+    def get_stats(self, outbound_id: int) -> Dict:
+        """Rolling stats over the last `window` probes of an outbound."""
+        samples = self._samples.get(outbound_id, ())
+        latencies = sorted(s.latency_ms for s in samples if s.ok and s.latency_ms is not None)
+        return {
+            "outbound_id": outbound_id,
+            "healthy": self.is_healthy(outbound_id),
+            "availability": (sum(1 for s in samples if s.ok) / len(samples)) if samples else None,
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p95_latency_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2) if latencies else None,
+            "last_latency_ms": samples[-1].latency_ms if samples else None,
+            "last_checked_at": samples[-1].checked_at if samples else None,
+            "last_error": self._last_error.get(outbound_id),
+            "consecutive_failures": self._failures.get(outbound_id, 0),
+            "samples": len(samples)
+        }
+
+    # ===========================
+    # Lifecycle
+    # ===========================
+
+    def start(self) -> None:
+        """Start the background probing task."""
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._core = CoreAdapter(
+                base_url=os.getenv("CORE_API_URL"),
+                api_key=os.getenv("CORE_API_KEY")
+            )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background probing task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._core is not None:
+            await self._core.close()
+            self._core = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbound health probe cycle failed: {str(e)}")
+
+            await asyncio.sleep(self.interval)
+
+    # ===========================
+    # Probing
+    # ===========================
+
+    async def _load_outbounds(self) -> List[Tuple[int, str, dict]]:
+        async with read_session_maker() as session:
+            result = await session.execute(select(Outbound.id, Outbound.name, Outbound.config))
+            return [(row[0], row[1], row[2] or {}) for row in result.all()]
+
+    async def probe_once(self, core: Optional[CoreAdapter] = None) -> int:
+        """
+        Probe every outbound once (with the given Core adapter or the
+        prober's own).
+
+        Returns:
+            Number of outbounds probed
+        """
+        core = core or self._core
+        if core is None:
+            raise RuntimeError("Health prober has no Core adapter; call start() or pass one")
+        outbounds = await self._load_outbounds()
+
+        # Forget deleted outbounds
+        known_ids = {outbound_id for outbound_id, _, _ in outbounds}
+        for outbound_id in list(self._samples.keys() | self._failures.keys()):
+            if outbound_id not in known_ids:
+                self._samples.pop(outbound_id, None)
+                self._failures.pop(outbound_id, None)
+                self._last_error.pop(outbound_id, None)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(outbound_id: int, name: str, config: dict) -> None:
+            async with semaphore:
+                try:
+                    latency_ms = await asyncio.wait_for(self._probe(core, name, config), timeout=self.timeout)
+                    self._record(outbound_id, True, latency_ms, None)
+                except asyncio.TimeoutError:
+                    self._record(outbound_id, False, None, f"Timed out after {self.timeout}s")
+                except (ProbeError, CoreConnectionError, OSError) as e:
+                    self._record(outbound_id, False, None, str(e))
+
+        await asyncio.gather(*(probe(*outbound) for outbound in outbounds))
+
+        unhealthy = self.unhealthy_ids()
+        occupancy.set_excluded(unhealthy)
+        if unhealthy:
+            logger.warning(f"Outbound health: {len(unhealthy)}/{len(outbounds)} outbounds unhealthy")
+
+        self.last_cycle_at = datetime.now(timezone.utc)
+        return len(outbounds)
+
+    async def _probe(self, core: CoreAdapter, name: str, config: dict) -> float:
+        """Run the checks for one outbound; returns latency in milliseconds."""
+        started = time.perf_counter()
+        info = await core.get_outbound_info(name)
+        if isinstance(info, dict) and info.get("code") not in (None, 0, 200):
+            raise ProbeError(f"Core reports outbound error: {info.get('msg') or info.get('code')}")
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        proxy_url = config.get("proxyUrl") or ""
+        if proxy_url:
+            latency_ms = await self._probe_proxy(proxy_url)
+
+        return round(latency_ms, 2)
+
+    async def _probe_proxy(self, proxy_url: str) -> float:
+        """TCP connect to an upstream proxy plus a SOCKS5 handshake; returns latency in ms."""
+        parts = urlsplit(proxy_url)
+        scheme = (parts.scheme or "socks5").lower()
+        if not parts.hostname:
+            raise ProbeError(f"Invalid proxyUrl '{proxy_url}'")
+        port = parts.port or (1080 if scheme.startswith("socks") else 8080)
+
+        started = time.perf_counter()
+        reader, writer = await asyncio.open_connection(parts.hostname, port)
+        try:
+            if scheme.startswith("socks5"):
+                await self._socks5_handshake(reader, writer, parts.username, parts.password)
+            return (time.perf_counter() - started) * 1000
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    @staticmethod
+    async def _socks5_handshake(reader, writer, username: Optional[str], password: Optional[str]) -> None:
+        # RFC 1928 greeting: offer no-auth, plus username/password when configured
+        methods = b"\x00\x02" if username else b"\x00"
+        writer.write(b"\x05" + bytes([len(methods)]) + methods)
+        await writer.drain()
+
+        version, method = await reader.readexactly(2)
+        if version != 5:
+            raise ProbeError("Upstream is not a SOCKS5 proxy")
+        if method == 0xFF:
+            raise ProbeError("SOCKS5 proxy rejected all auth methods")
+
+        if method == 0x02:
+            # RFC 1929 username/password sub-negotiation
+            user = unquote(username or "").encode()
+            passwd = unquote(password or "").encode()
+            writer.write(b"\x01" + bytes([len(user)]) + user + bytes([len(passwd)]) + passwd)
+            await writer.drain()
+            _, status = await reader.readexactly(2)
+            if status != 0:
+                raise ProbeError("SOCKS5 proxy rejected the credentials")
+
+    def _record(self, outbound_id: int, ok: bool, latency_ms: Optional[float], error: Optional[str]) -> None:
+        samples = self._samples.setdefault(outbound_id, deque(maxlen=self.window))
+        samples.append(ProbeSample(ok, latency_ms, datetime.now(timezone.utc)))
+        if ok:
+            self._failures[outbound_id] = 0
+            self._last_error[outbound_id] = None
+        else:
+            self._failures[outbound_id] = self._failures.get(outbound_id, 0) + 1
+            self._last_error[outbound_id] = error
+
+
+health_prober = OutboundHealthProber(
+    interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "60")),
+    concurrency=int(os.getenv("HEALTH_PROBE_CONCURRENCY", "20")),
+    timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "5")),
+    window=int(os.getenv("HEALTH_PROBE_WINDOW", "20")),
+    failure_threshold=int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+)
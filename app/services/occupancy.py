@@ -0,0 +1,472 @@
+"""
+Outbound Occupancy Index
+In-memory outbound x rule occupancy matrix for instant inventory reads.
+"""
+from sqlalchemy import select
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from datetime import datetime, timezone
+import asyncio
+import heapq
+import logging
+import os
+import time
+
+from app.database import read_session_maker
+from app.models import User, Outbound, UserRule
+from app.services import placement
+from app.services.placement import PlacementCandidate, placement_group
+
+logger = logging.getLogger(__name__)
+
+
+class _UserEntry(NamedTuple):
+    outbound_id: int
+    rule_ids: FrozenSet[int]
+    enable: bool
+    expire_ts: float
+
+
+def _to_timestamp(value: datetime) -> float:
+    # Stored datetimes are compared as UTC wall time (see UserService._should_sync_to_core)
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Yield set bit positions of mask in ascending order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class OutboundOccupancy:
+    """
+    Occupancy of outbounds by active users, kept in memory.
+
+    - Every outbound gets a bit position
+    - Per rule, a bitset of outbounds used by active users for that rule
+    - Per outbound, an active-user counter and a "has free slots" bitset
+
+    Built once at startup, updated incrementally by UserService/OutboundService/
+    RuleService after each commit, expired lazily from a heap of expire times, and
+    periodically verified against the database. State is per process.
+    """
+
+    def __init__(self, verify_interval: float = 300.0):
+        self.verify_interval = verify_interval
+
+        self._positions: Dict[int, int] = {}  # outbound_id -> bit position
+        self._outbound_ids: List[Optional[int]] = []  # bit position -> outbound_id
+        self._max_users: List[int] = []
+        self._groups: List[str] = []  # placement group (public IP) per bit position
+        self._active: List[int] = []  # active users per bit position
+        self._outbound_mask = 0  # all existing outbounds
+        self._free_mask = 0  # outbounds with active users < max_users
+        self._load_masks: Dict[int, int] = {}  # active user count -> outbounds at that load
+        self._excluded_ids: Set[int] = set()  # outbounds kept out of placement (unhealthy)
+        self._excluded_mask = 0
+
+        self._rule_bits: Dict[int, int] = {}  # rule_id -> outbounds used for the rule
+        self._rule_refs: Dict[Tuple[int, int], int] = {}  # (rule_id, position) -> active users
+
+        self._users: Dict[int, _UserEntry] = {}
+        self._counted: Set[int] = set()  # users currently contributing to the counters
+        self._expiry: List[Tuple[float, int]] = []  # heap of (expire_ts, user_id)
+
+        self._version = 0
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+        self.built_at: Optional[datetime] = None
+
+    # ===========================
+    # Outbound Updates
+    # ===========================
+
+    def add_outbound(self, outbound_id: int, max_users: int, group: str = "") -> None:
+        """Register an outbound (or update its capacity and group)."""
+        self._version += 1
+        pos = self._positions.get(outbound_id)
+        if pos is None:
+            pos = len(self._outbound_ids)
+            self._positions[outbound_id] = pos
+            self._outbound_ids.append(outbound_id)
+            self._max_users.append(max_users)
+            self._groups.append(group)
+            self._active.append(0)
+            self._outbound_mask |= 1 << pos
+            self._load_masks[0] = self._load_masks.get(0, 0) | (1 << pos)
+            if outbound_id in self._excluded_ids:
+                self._excluded_mask |= 1 << pos
+        else:
+            self._max_users[pos] = max_users
+            self._groups[pos] = group
+        self._refresh_free(pos)
+
+    def remove_outbound(self, outbound_id: int) -> None:
+        """Forget an outbound; its bit position is not reused."""
+        self._version += 1
+        pos = self._positions.pop(outbound_id, None)
+        if pos is None:
+            return
+        bit = 1 << pos
+        self._outbound_ids[pos] = None
+        level = self._active[pos]
+        self._load_masks[level] = self._load_masks.get(level, 0) & ~bit
+        self._active[pos] = 0
+        self._outbound_mask &= ~bit
+        self._free_mask &= ~bit
+        self._excluded_mask &= ~bit
+        for rule_id in list(self._rule_bits):
+            self._rule_bits[rule_id] &= ~bit
+            self._rule_refs.pop((rule_id, pos), None)
+
+    # ===========================
+    # Rule Updates
+    # ===========================
+
+    def remove_rule(self, rule_id: int) -> None:
+        """Forget a deleted rule: clear its outbound bits and drop it from every user."""
+        self._version += 1
+        self._rule_bits.pop(rule_id, None)
+        for key in [key for key in self._rule_refs if key[0] == rule_id]:
+            del self._rule_refs[key]
+        for user_id, entry in self._users.items():
+            if rule_id in entry.rule_ids:
+                self._users[user_id] = entry._replace(rule_ids=entry.rule_ids - {rule_id})
+
+    # ===========================
+    # User Updates
+    # ===========================
+
+    def update_user(
+        self,
+        user_id: int,
+        outbound_id: int,
+        enable: bool,
+        expire_time: datetime,
+        rule_ids: Optional[Iterable[int]] = None
+    ) -> None:
+        """
+        Record the current state of a user.
+
+        Args:
+            rule_ids: New rule assignment, or None to keep the known one
+        """
+        self._version += 1
+        previous = self._users.get(user_id)
+        if rule_ids is None:
+            rules = previous.rule_ids if previous else frozenset()
+        else:
+            rules = frozenset(rule_ids)
+
+        if user_id in self._counted:
+            self._uncount(user_id)
+
+        entry = _UserEntry(outbound_id, rules, bool(enable), _to_timestamp(expire_time))
+        self._users[user_id] = entry
+
+        if entry.enable and entry.expire_ts > time.time():
+            self._count(user_id)
+            heapq.heappush(self._expiry, (entry.expire_ts, user_id))
+
+    def remove_user(self, user_id: int) -> None:
+        """Forget a deleted user."""
+        self._version += 1
+        if user_id in self._counted:
+            self._uncount(user_id)
+        self._users.pop(user_id, None)
+
+    def _count(self, user_id: int) -> None:
+        entry = self._users[user_id]
+        self._counted.add(user_id)
+        pos = self._positions.get(entry.outbound_id)
+        if pos is None:
+            return
+        self._set_active(pos, self._active[pos] + 1)
+        for rule_id in entry.rule_ids:
+            key = (rule_id, pos)
+            self._rule_refs[key] = self._rule_refs.get(key, 0) + 1
+            if self._rule_refs[key] == 1:
+                self._rule_bits[rule_id] = self._rule_bits.get(rule_id, 0) | (1 << pos)
+
+    def _uncount(self, user_id: int) -> None:
+        entry = self._users[user_id]
+        self._counted.discard(user_id)
+        pos = self._positions.get(entry.outbound_id)
+        if pos is None:
+            return
+        self._set_active(pos, max(0, self._active[pos] - 1))
+        for rule_id in entry.rule_ids:
+            key = (rule_id, pos)
+            refs = self._rule_refs.get(key, 0) - 1
+            if refs > 0:
+                self._rule_refs[key] = refs
+            else:
+                self._rule_refs.pop(key, None)
+                self._rule_bits[rule_id] = self._rule_bits.get(rule_id, 0) & ~(1 << pos)
+
+    def _set_active(self, pos: int, value: int) -> None:
+        bit = 1 << pos
+        old = self._active[pos]
+        self._load_masks[old] = self._load_masks.get(old, 0) & ~bit
+        self._load_masks[value] = self._load_masks.get(value, 0) | bit
+        self._active[pos] = value
+        self._refresh_free(pos)
+
+    def _refresh_free(self, pos: int) -> None:
+        if self._outbound_ids[pos] is not None and self._active[pos] < self._max_users[pos]:
+            self._free_mask |= 1 << pos
+        else:
+            self._free_mask &= ~(1 << pos)
+
+    def _expire_due(self) -> None:
+        """Stop counting users whose expire_time has passed."""
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            expire_ts, user_id = heapq.heappop(self._expiry)
+            entry = self._users.get(user_id)
+            # Skip stale heap entries left behind by renewals/updates
+            if entry and entry.expire_ts == expire_ts and user_id in self._counted:
+                self._version += 1
+                self._uncount(user_id)
+
+    # ===========================
+    # Read API
+    # ===========================
+
+    @property
+    def version(self) -> int:
+        """Bumped on every change to outbounds or users; used to invalidate derived caches."""
+        return self._version
+
+    def total_outbounds(self) -> int:
+        """Number of known outbounds."""
+        return self._outbound_mask.bit_count()
+
+    def used_ips(self, rule_id: int) -> int:
+        """Number of outbounds used for a rule by active users."""
+        self._expire_due()
+        return self._rule_bits.get(rule_id, 0).bit_count()
+
+    def available_outbound_mask(self, rule_id: int) -> int:
+        """Bitset of outbounds with free slots that are not yet used for the rule."""
+        self._expire_due()
+        return self._free_mask & ~self._rule_bits.get(rule_id, 0)
+
+    def available_outbound_ids(self, rule_id: int, limit: Optional[int] = None) -> List[int]:
+        """Outbound IDs that can take a new user for the rule, in outbound order."""
+        ids = []
+        for pos in iter_bits(self.available_outbound_mask(rule_id)):
+            ids.append(self._outbound_ids[pos])
+            if limit and len(ids) >= limit:
+                break
+        return ids
+
+    def set_excluded(self, outbound_ids: Iterable[int]) -> None:
+        """Keep these outbounds out of placement (inventory counts are unaffected)."""
+        self._excluded_ids = set(outbound_ids)
+        self._excluded_mask = self._mask_for(self._excluded_ids)
+
+    def is_excluded(self, outbound_id: int) -> bool:
+        return outbound_id in self._excluded_ids
+
+    def placement_mask(self, rule_id: int) -> int:
+        """Available outbounds for the rule that may receive new users."""
+        return self.available_outbound_mask(rule_id) & ~self._excluded_mask
+
+    def placement_candidates(self, rule_id: int) -> List[PlacementCandidate]:
+        """Placeable outbounds for the rule with their current load."""
+        return [
+            PlacementCandidate(
+                self._outbound_ids[pos], self._active[pos], self._max_users[pos], self._groups[pos]
+            )
+            for pos in iter_bits(self.placement_mask(rule_id))
+        ]
+
+    def choose_outbounds(
+        self,
+        rule_id: int,
+        count: int,
+        strategy: Optional[str] = None,
+        advance: bool = True
+    ) -> List[int]:
+        """
+        Placement over the precomputed load bitsets; cost grows with `count`,
+        not with the number of outbounds. Spread needs group totals and goes
+        through placement.choose over the candidate list.
+        """
+        strategy = strategy or placement.DEFAULT_STRATEGY
+        available = self.placement_mask(rule_id)
+
+        if strategy in (placement.LEAST_LOADED, placement.BIN_PACK):
+            levels = sorted(self._load_masks, reverse=strategy == placement.BIN_PACK)
+            chosen = []
+            for level in levels:
+                for pos in iter_bits(available & self._load_masks[level]):
+                    chosen.append(self._outbound_ids[pos])
+                    if len(chosen) == count:
+                        return chosen
+            return chosen
+
+        if strategy == placement.ROUND_ROBIN:
+            last_pos = self._positions.get(placement.get_round_robin_cursor(rule_id))
+            after = available & ~((1 << (last_pos + 1)) - 1) if last_pos is not None else available
+            chosen = []
+            for mask in (after, available & ~after):
+                for pos in iter_bits(mask):
+                    chosen.append(self._outbound_ids[pos])
+                    if len(chosen) == count:
+                        break
+                if len(chosen) == count:
+                    break
+            if chosen and advance:
+                placement.set_round_robin_cursor(rule_id, chosen[-1])
+            return chosen
+
+        return placement.choose(self.placement_candidates(rule_id), count, strategy, rule_id, advance)
+
+    def user_rule_ids(self, user_id: int) -> FrozenSet[int]:
+        """Rules last recorded for a user."""
+        entry = self._users.get(user_id)
+        return entry.rule_ids if entry else frozenset()
+
+    def active_users(self, outbound_id: int) -> int:
+        """Active users on an outbound."""
+        self._expire_due()
+        pos = self._positions.get(outbound_id)
+        return self._active[pos] if pos is not None else 0
+
+    def snapshot(self) -> Dict:
+        """Outbound-ID based view of the counters, used for verification."""
+        self._expire_due()
+        return {
+            "active": {
+                outbound_id: self._active[pos]
+                for outbound_id, pos in self._positions.items()
+            },
+            "max_users": {
+                outbound_id: self._max_users[pos]
+                for outbound_id, pos in self._positions.items()
+            },
+            "groups": {
+                outbound_id: self._groups[pos]
+                for outbound_id, pos in self._positions.items()
+            },
+            "rules": {
+                rule_id: sorted(self._outbound_ids[pos] for pos in iter_bits(bits))
+                for rule_id, bits in self._rule_bits.items()
+                if bits
+            }
+        }
+
+    # ===========================
+    # Build & Verification
+    # ===========================
+
+    @classmethod
+    async def load(cls) -> "OutboundOccupancy":
+        """Build a fresh index from the database."""
+        index = cls()
+        async with read_session_maker() as session:
+            result = await session.execute(
+                select(
+                    Outbound.id, Outbound.max_users, Outbound.config, Outbound.local_interface_ip
+                ).order_by(Outbound.id)
+            )
+            for outbound_id, max_users, config, local_interface_ip in result.all():
+                index.add_outbound(outbound_id, max_users, placement_group(config, local_interface_ip))
+
+            result = await session.execute(select(UserRule.user_id, UserRule.rule_id))
+            rules_by_user: Dict[int, Set[int]] = {}
+            for user_id, rule_id in result.all():
+                rules_by_user.setdefault(user_id, set()).add(rule_id)
+
+            result = await session.execute(
+                select(User.id, User.outbound_id, User.enable, User.expire_time)
+            )
+            for user_id, outbound_id, enable, expire_time in result.all():
+                index.update_user(
+                    user_id, outbound_id, enable, expire_time,
+                    rules_by_user.get(user_id, ())
+                )
+
+        index.ready = True
+        index.built_at = datetime.now(timezone.utc)
+        return index
+
+    def _adopt(self, other: "OutboundOccupancy") -> None:
+        for name in (
+            "_positions", "_outbound_ids", "_max_users", "_groups", "_active",
+            "_outbound_mask", "_free_mask", "_load_masks", "_rule_bits", "_rule_refs",
+            "_users", "_counted", "_expiry", "ready", "built_at"
+        ):
+            setattr(self, name, getattr(other, name))
+        self._excluded_mask = self._mask_for(self._excluded_ids)
+        self._version += 1
+
+    def _mask_for(self, outbound_ids: Iterable[int]) -> int:
+        mask = 0
+        for outbound_id in outbound_ids:
+            pos = self._positions.get(outbound_id)
+            if pos is not None:
+                mask |= 1 << pos
+        return mask
+
+    async def rebuild(self) -> None:
+        """Replace the in-memory state with a fresh build from the database."""
+        self._adopt(await self.load())
+        logger.info(
+            f"Occupancy index built: {self.total_outbounds()} outbounds, "
+            f"{len(self._counted)} active users"
+        )
+
+    async def verify(self) -> bool:
+        """
+        Compare the in-memory state against the database and repair drift.
+
+        Returns:
+            True if the index matched (or changed while loading), False if it was repaired
+        """
+        version = self._version
+        fresh = await self.load()
+
+        # Writes happened while loading - the fresh copy may already be stale
+        if self._version != version:
+            return True
+
+        if fresh.snapshot() == self.snapshot():
+            return True
+
+        logger.warning("Occupancy index drifted from database, rebuilding")
+        self._adopt(fresh)
+        return False
+
+    def start(self) -> None:
+        """Start the periodic verification task."""
+        if self.verify_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic verification task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.verify_interval)
+            try:
+                await self.verify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Occupancy verification failed: {str(e)}")
+
+
+occupancy = OutboundOccupancy(
+    verify_interval=float(os.getenv("OCCUPANCY_VERIFY_INTERVAL", "300"))
+)
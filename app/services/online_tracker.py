@@ -0,0 +1,186 @@
+"""
+Online User Tracker
+Background collector that polls Core connection lists for active ports.
+Keeps an in-memory online set so views never hit the Core directly.
+"""
+from sqlalchemy import select
+from typing import Dict, Optional, Set
+from datetime import datetime, timezone
+import asyncio
+import logging
+import os
+import time
+
+from app.database import read_session_maker
+from app.models import User
+from app.core_client import CoreAdapter, CoreConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+class OnlineUserTracker:
+    """
+    Polls getUserConnList for every active port with bounded concurrency.
+
+    Scheduling:
+    - Hot ports (had connections on the last poll) are polled every `hot_interval` seconds
+    - Idle ports back off, doubling up to `idle_interval` seconds
+    - Ports of users that are no longer active are dropped from the set
+    """
+
+    def __init__(
+        self,
+        hot_interval: float = 10.0,
+        idle_interval: float = 60.0,
+        concurrency: int = 10
+    ):
+        self.hot_interval = hot_interval
+        self.idle_interval = idle_interval
+        self.concurrency = concurrency
+
+        self._connections: Dict[int, int] = {}  # port -> connection count
+        self._checked_at: Dict[int, datetime] = {}  # port -> last successful poll
+        self._next_poll: Dict[int, float] = {}  # port -> monotonic due time
+        self._backoff: Dict[int, float] = {}  # port -> current idle interval
+
+        self._core: Optional[CoreAdapter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_cycle_at: Optional[datetime] = None
+
+    # ===========================
+    # Read API
+    # ===========================
+
+    def online_ports(self) -> Set[int]:
+        """Ports that had at least one connection on their last poll."""
+        return {port for port, count in self._connections.items() if count > 0}
+
+    def online_count(self) -> int:
+        """Number of users currently online."""
+        return sum(1 for count in self._connections.values() if count > 0)
+
+    def get_port_status(self, port: int) -> Dict:
+        """Online state for a single port."""
+        count = self._connections.get(port, 0)
+        return {
+            "port": port,
+            "online": count > 0,
+            "connection_count": count,
+            "checked_at": self._checked_at.get(port)
+        }
+
+    # ===========================
+    # Lifecycle
+    # ===========================
+
+    def start(self) -> None:
+        """Start the background polling task."""
+        if self._task is None or self._task.done():
+            self._core = CoreAdapter(
+                base_url=os.getenv("CORE_API_URL"),
+                api_key=os.getenv("CORE_API_KEY")
+            )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background polling task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._core is not None:
+            await self._core.close()
+            self._core = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Online tracker cycle failed: {str(e)}")
+
+            await asyncio.sleep(self.hot_interval)
+
+    # ===========================
+    # Polling
+    # ===========================
+
+    async def _load_active_ports(self) -> Set[int]:
+        now = datetime.now(timezone.utc)
+        async with read_session_maker() as session:
+            result = await session.execute(
+                select(User.port).where(
+                    User.enable == True,
+                    User.expire_time > now
+                )
+            )
+            return set(row[0] for row in result.all())
+
+    async def poll_once(self) -> int:
+        """
+        Run one scheduling cycle: poll every port that is due.
+
+        Returns:
+            Number of ports polled
+        """
+        active_ports = await self._load_active_ports()
+
+        # Forget ports whose users were deleted, disabled or expired
+        for port in list(self._connections.keys() | self._next_poll.keys()):
+            if port not in active_ports:
+                self._connections.pop(port, None)
+                self._checked_at.pop(port, None)
+                self._next_poll.pop(port, None)
+                self._backoff.pop(port, None)
+
+        now = time.monotonic()
+        due = [port for port in active_ports if self._next_poll.get(port, 0) <= now]
+        if not due:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failures = 0
+
+        async def poll(port: int) -> None:
+            nonlocal failures
+            async with semaphore:
+                try:
+                    conns = await self._core.get_user_connections(f"0.0.0.0:{port}")
+                except CoreConnectionError:
+                    failures += 1
+                    self._schedule(port, hot=False)
+                    return
+
+            count = len(conns or [])
+            self._connections[port] = count
+            self._checked_at[port] = datetime.now(timezone.utc)
+            self._schedule(port, hot=count > 0)
+
+        await asyncio.gather(*(poll(port) for port in due))
+
+        if failures:
+            logger.warning(f"Online tracker: {failures}/{len(due)} connection list requests failed")
+
+        self.last_cycle_at = datetime.now(timezone.utc)
+        return len(due)
+
+    def _schedule(self, port: int, hot: bool) -> None:
+        if hot:
+            interval = self.hot_interval
+        else:
+            interval = min(self._backoff.get(port, self.hot_interval) * 2, self.idle_interval)
+        self._backoff[port] = interval
+        self._next_poll[port] = time.monotonic() + interval
+
+
+online_tracker = OnlineUserTracker(
+    hot_interval=float(os.getenv("ONLINE_POLL_HOT_INTERVAL", "10")),
+    idle_interval=float(os.getenv("ONLINE_POLL_IDLE_INTERVAL", "60")),
+    concurrency=int(os.getenv("ONLINE_POLL_CONCURRENCY", "10"))
+)
@@ -3,13 +3,26 @@ Outbound Service Layer
 Handles outbound proxy configuration business logic.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy import select, insert, delete, update, case, func
+from bisect import insort
+from typing import Dict, List, Optional, Set
+from datetime import datetime, timezone
 
-from app.models import Outbound
+from app.database import begin_immediate, release_connection
+from app.models import Outbound, User, UserRule
 from app.schemas import OutboundCreate, OutboundUpdate
 from app.core_client import CoreAdapter, CoreConnectionError
+from app.services.occupancy import occupancy
+from app.services.event_bus import event_bus
+from app.services.core_resync import core_resync
+from app.services.placement import placement_group
+from app.services.game_inventory_service import GameInventoryService
+
+# Users reassigned per UPDATE statement when draining an outbound
+DRAIN_UPDATE_CHUNK = 500
+
+# Sort keys for the outbound list with stats
+OUTBOUND_SORT_KEYS = ("load", "active", "free", "games", "name")
 
 
 class OutboundService:
@@ -26,6 +39,58 @@ class OutboundService:
         result = await self.db.execute(select(Outbound))
         return list(result.scalars().all())
 
+    async def get_all_with_stats(self, sort: Optional[str] = None, descending: bool = True) -> List[Dict]:
+        """
+        All outbounds with active user count, free slots and game count,
+        computed in one query (outbound LEFT JOIN two grouped subqueries).
+
+        sort: one of OUTBOUND_SORT_KEYS (None keeps ID order)
+        """
+        if sort is not None and sort not in OUTBOUND_SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort}'. Choose from: {', '.join(OUTBOUND_SORT_KEYS)}")
+
+        now = datetime.now(timezone.utc)
+        active = GameInventoryService._active_counts_subquery(now)
+        games = (
+            select(User.outbound_id, func.count(func.distinct(UserRule.rule_id)).label("game_count"))
+            .join(UserRule, UserRule.user_id == User.id)
+            .where(User.enable == True, User.expire_time > now)
+            .group_by(User.outbound_id)
+            .subquery()
+        )
+
+        active_users = func.coalesce(active.c.active_users, 0)
+        game_count = func.coalesce(games.c.game_count, 0)
+        sort_columns = {
+            "load": active_users * 1.0 / Outbound.max_users,
+            "active": active_users,
+            "free": Outbound.max_users - active_users,
+            "games": game_count,
+            "name": Outbound.name
+        }
+
+        query = (
+            select(Outbound, active_users, game_count)
+            .outerjoin(active, active.c.outbound_id == Outbound.id)
+            .outerjoin(games, games.c.outbound_id == Outbound.id)
+        )
+        if sort is not None:
+            column = sort_columns[sort]
+            query = query.order_by(column.desc() if descending else column.asc())
+        query = query.order_by(Outbound.id)
+
+        result = await self.db.execute(query)
+        return [
+            {
+                **{column.key: getattr(outbound, column.key) for column in Outbound.__table__.columns},
+                "active_user_count": active_count,
+                "available_slots": max(outbound.max_users - active_count, 0),
+                "game_count": games_used,
+                "load": round(active_count / outbound.max_users, 4) if outbound.max_users else 0.0
+            }
+            for outbound, active_count, games_used in result.all()
+        ]
+
     async def get_by_id(self, outbound_id: int) -> Optional[Outbound]:
         """Get outbound by ID."""
         result = await self.db.execute(
@@ -57,11 +122,12 @@ class OutboundService:
             config=outbound_data.config,
             local_interface_ip=outbound_data.local_interface_ip,
             remark=outbound_data.remark,
+            max_users=outbound_data.max_users,
             is_auto_generated=outbound_data.is_auto_generated
         )
 
         self.db.add(outbound)
-        await self.db.flush()
+        await self.db.commit()
 
         # Sync to Core Service
         try:
@@ -77,19 +143,30 @@ class OutboundService:
             # Log error but don't fail - database is source of truth
             print(f"Warning: Failed to sync outbound to Core: {str(e)}")
 
-        await self.db.commit()
         await self.db.refresh(outbound)
+        occupancy.add_outbound(
+            outbound.id, outbound.max_users,
+            placement_group(outbound.config, outbound.local_interface_ip)
+        )
+        event_bus.publish_outbounds_changed()
         return outbound
 
     async def update(self, outbound_id: int, outbound_data: OutboundUpdate) -> Outbound:
         """
         Update existing outbound.
-        Updates database and syncs to Core Service.
+        Updates database and syncs to Core Service. A rename creates the
+        outbound under the new name in Core, re-pushes its users and then
+        deletes the old name.
         """
         outbound = await self.get_by_id(outbound_id)
         if not outbound:
             raise ValueError(f"Outbound with ID {outbound_id} not found")
 
+        old_name = outbound.name
+        if outbound_data.name is not None and outbound_data.name != old_name:
+            if await self.get_by_name(outbound_data.name):
+                raise ValueError(f"Outbound with name '{outbound_data.name}' already exists")
+
         # Update fields
         if outbound_data.name is not None:
             outbound.name = outbound_data.name
@@ -101,23 +178,52 @@ class OutboundService:
             outbound.local_interface_ip = outbound_data.local_interface_ip
         if outbound_data.remark is not None:
             outbound.remark = outbound_data.remark
+        if outbound_data.max_users is not None:
+            outbound.max_users = outbound_data.max_users
 
         outbound.updated_at = datetime.utcnow()
+        renamed = outbound.name != old_name
+        await self.db.commit()
+
+        # Capacity and placement group may have changed
+        occupancy.add_outbound(
+            outbound.id, outbound.max_users,
+            placement_group(outbound.config, outbound.local_interface_ip)
+        )
 
         # Sync to Core Service
         try:
             eh = outbound.config.get("eh", outbound.local_interface_ip)
             proxy_url = outbound.config.get("proxyUrl", "")
 
-            await self.core.edit_outbound(
-                name=outbound.name,
-                eh=eh,
-                proxy_url=proxy_url
-            )
+            if renamed:
+                await self.core.create_outbound(name=outbound.name, eh=eh, proxy_url=proxy_url)
+            else:
+                await self.core.edit_outbound(
+                    name=outbound.name,
+                    eh=eh,
+                    proxy_url=proxy_url
+                )
         except CoreConnectionError as e:
             print(f"Warning: Failed to sync outbound update to Core: {str(e)}")
 
-        await self.db.commit()
+        if renamed:
+            async def delete_old_name(job, core: CoreAdapter) -> None:
+                if job.failed:
+                    print(f"Warning: Keeping outbound {old_name} in Core, {job.failed} users still reference it")
+                    return
+                try:
+                    await core.delete_outbound(old_name)
+                except CoreConnectionError as e:
+                    print(f"Warning: Failed to delete outbound {old_name} from Core: {str(e)}")
+
+            await core_resync.resync(
+                self.db,
+                f"outbound {old_name} renamed to {outbound.name}",
+                select(User.id).where(User.outbound_id == outbound.id),
+                after=delete_old_name
+            )
+
         await self.db.refresh(outbound)
         return outbound
 
@@ -130,66 +236,298 @@ class OutboundService:
         if not outbound:
             raise ValueError(f"Outbound with ID {outbound_id} not found")
 
-        # Delete from Core Service first
+        # Delete from database
+        await self.db.delete(outbound)
+        await self.db.commit()
+
         try:
             await self.core.delete_outbound(outbound.name)
         except CoreConnectionError as e:
             print(f"Warning: Failed to delete outbound from Core: {str(e)}")
 
-        # Delete from database
-        await self.db.delete(outbound)
-        await self.db.commit()
+        occupancy.remove_outbound(outbound_id)
+        event_bus.publish_outbounds_changed()
         return True
 
-    async def scan_local_interfaces(self) -> List[Outbound]:
+    async def scan_local_interfaces(self, prune: bool = False) -> Dict:
         """
         One-click scan: Get all local network interfaces and create outbounds.
         This is a key feature - automatically creates direct outbounds for all local IPs.
 
+        Interfaces are diffed against existing outbounds in memory; new outbounds
+        are registered with one createOutBounds call and then inserted in one
+        transaction. If the Core push fails nothing is created.
+
+        Args:
+            prune: Also delete auto-generated outbounds whose interface no longer
+                exists (outbounds that still have users are kept)
+
         Returns:
-            List of created outbounds
+            {"created": [Outbound, ...], "pruned": [name, ...], "kept_in_use": [name, ...]}
         """
-        created_outbounds = []
-
         try:
-            # Get interfaces from Core Service
             interfaces = await self.core.get_interfaces()
+        except CoreConnectionError as e:
+            raise ValueError(f"Failed to scan interfaces: {str(e)}")
 
-            for interface in interfaces:
-                eh_name = interface.get("ehName", "")
-                eh_ip = interface.get("eh", "")
-                public_ip = interface.get("ip", "")
-
-                if not eh_ip:
-                    continue
-
-                # Generate unique name
-                outbound_name = f"direct_{eh_name}_{eh_ip.replace('.', '_')}"
-
-                # Check if already exists
-                existing = await self.get_by_name(outbound_name)
-                if existing:
-                    continue
-
-                # Create outbound
-                outbound_data = OutboundCreate(
-                    name=outbound_name,
-                    protocol="direct",
-                    config={
-                        "eh": eh_ip,
-                        "proxyUrl": "",
-                        "publicIp": public_ip,
-                        "interfaceName": eh_name
-                    },
-                    local_interface_ip=eh_ip,
-                    remark=f"Auto-scanned: {eh_name} ({public_ip})",
-                    is_auto_generated=True
+        # Desired outbounds by name
+        scanned: Dict[str, Dict] = {}
+        for interface in interfaces:
+            eh_name = interface.get("ehName", "")
+            eh_ip = interface.get("eh", "")
+            public_ip = interface.get("ip", "")
+
+            if not eh_ip:
+                continue
+
+            outbound_name = f"direct_{eh_name}_{eh_ip.replace('.', '_')}"
+            scanned[outbound_name] = {
+                "name": outbound_name,
+                "protocol": "direct",
+                "config": {
+                    "eh": eh_ip,
+                    "proxyUrl": "",
+                    "publicIp": public_ip,
+                    "interfaceName": eh_name
+                },
+                "local_interface_ip": eh_ip,
+                "remark": f"Auto-scanned: {eh_name} ({public_ip})",
+                "is_auto_generated": True
+            }
+
+        result = await self.db.execute(
+            select(Outbound.name, Outbound.is_auto_generated, Outbound.local_interface_ip)
+        )
+        existing = result.all()
+        existing_names = {row.name for row in existing}
+        new_rows = [data for name, data in scanned.items() if name not in existing_names]
+
+        # Auto-generated outbounds whose interface IP disappeared
+        stale_names: List[str] = []
+        if prune:
+            scanned_ips = {data["local_interface_ip"] for data in scanned.values()}
+            stale_names = [
+                row.name for row in existing
+                if row.is_auto_generated and row.local_interface_ip not in scanned_ips
+            ]
+
+        if not new_rows and not stale_names:
+            return {"created": [], "pruned": [], "kept_in_use": []}
+
+        # Register new outbounds in Core before inserting them, without holding
+        # the writer; if the push fails nothing is created
+        await release_connection(self.db)
+        if new_rows:
+            try:
+                await self.core.create_outbounds([
+                    {"name": data["name"], "eh": data["config"]["eh"], "proxyUrl": ""}
+                    for data in new_rows
+                ])
+            except CoreConnectionError as e:
+                raise ValueError(f"Failed to register scanned outbounds in Core, nothing was created: {str(e)}")
+
+        # Write phase; other writers may have run during the Core call, so
+        # re-check names and usage under the write lock
+        await begin_immediate(self.db)
+
+        new_ids: List[int] = []
+        if new_rows:
+            result = await self.db.execute(
+                select(Outbound.name).where(Outbound.name.in_([data["name"] for data in new_rows]))
+            )
+            taken = set(result.scalars().all())
+            new_rows = [data for data in new_rows if data["name"] not in taken]
+        if new_rows:
+            result = await self.db.execute(
+                insert(Outbound).returning(Outbound.id),
+                new_rows
+            )
+            new_ids = [row[0] for row in result.all()]
+
+        stale: Dict[int, str] = {}
+        kept_in_use: List[str] = []
+        if stale_names:
+            result = await self.db.execute(
+                select(Outbound.id, Outbound.name).where(
+                    Outbound.name.in_(stale_names),
+                    Outbound.is_auto_generated == True
                 )
+            )
+            stale = {row.id: row.name for row in result.all()}
+            if stale:
+                result = await self.db.execute(
+                    select(User.outbound_id)
+                    .where(User.outbound_id.in_(stale.keys()))
+                    .distinct()
+                )
+                for (outbound_id,) in result.all():
+                    kept_in_use.append(stale.pop(outbound_id))
+            if stale:
+                await self.db.execute(delete(Outbound).where(Outbound.id.in_(stale.keys())))
 
-                outbound = await self.create(outbound_data)
-                created_outbounds.append(outbound)
+        await self.db.commit()
 
-        except CoreConnectionError as e:
-            raise ValueError(f"Failed to scan interfaces: {str(e)}")
+        # Core has no batch delete; the database is already authoritative
+        for outbound_id, name in stale.items():
+            occupancy.remove_outbound(outbound_id)
+            try:
+                await self.core.delete_outbound(name)
+            except CoreConnectionError as e:
+                print(f"Warning: Failed to delete pruned outbound {name} from Core: {str(e)}")
+
+        created: List[Outbound] = []
+        if new_ids:
+            result = await self.db.execute(
+                select(Outbound).where(Outbound.id.in_(new_ids)).order_by(Outbound.id)
+            )
+            created = list(result.scalars().all())
+            for outbound in created:
+                occupancy.add_outbound(
+                    outbound.id, outbound.max_users,
+                    placement_group(outbound.config, outbound.local_interface_ip)
+                )
+
+        if created or stale:
+            event_bus.publish_outbounds_changed()
+
+        return {
+            "created": created,
+            "pruned": list(stale.values()),
+            "kept_in_use": kept_in_use
+        }
+
+    async def drain(self, outbound_id: int, partial: bool = False) -> Dict:
+        """
+        Move all active users off an outbound (e.g. an IP blocked by a game).
+
+        Targets are chosen least-loaded first among the other placeable
+        outbounds, respecting max_users and the one-outbound-per-game rule
+        for every game of the moved user. Users are reassigned with set-based
+        UPDATEs in one transaction and re-pushed to Core by core_resync.
+        Disabled/expired users are not in Core and stay where they are.
+
+        partial=False refuses the drain unless every user can be placed.
+
+        Returns:
+            moved/unplaced user IDs, moves per target outbound and the re-sync job
+        """
+        await begin_immediate(self.db)
+
+        source = await self.get_by_id(outbound_id)
+        if not source:
+            raise ValueError(f"Outbound with ID {outbound_id} not found")
 
-        return created_outbounds
+        now = datetime.now(timezone.utc)
+        result = await self.db.execute(
+            select(User.id).where(
+                User.outbound_id == outbound_id,
+                User.enable == True,
+                User.expire_time > now
+            )
+        )
+        user_ids = list(result.scalars().all())
+        if not user_ids:
+            await self.db.commit()
+            return {"moved": [], "unplaced": [], "targets": {}, "resync_job": None}
+
+        result = await self.db.execute(
+            select(UserRule.user_id, UserRule.rule_id).where(UserRule.user_id.in_(user_ids))
+        )
+        user_rules: Dict[int, Set[int]] = {user_id: set() for user_id in user_ids}
+        for user_id, rule_id in result.all():
+            user_rules[user_id].add(rule_id)
+
+        # Current load and games per outbound, from active users only
+        active = GameInventoryService._active_counts_subquery(now)
+        result = await self.db.execute(
+            select(Outbound.id, Outbound.max_users, func.coalesce(active.c.active_users, 0))
+            .outerjoin(active, active.c.outbound_id == Outbound.id)
+            .where(Outbound.id != outbound_id)
+        )
+        load: Dict[int, int] = {}
+        capacity: Dict[int, int] = {}
+        for target_id, max_users, active_users in result.all():
+            if active_users < max_users and not occupancy.is_excluded(target_id):
+                load[target_id] = active_users
+                capacity[target_id] = max_users
+
+        result = await self.db.execute(
+            select(User.outbound_id, UserRule.rule_id)
+            .join(UserRule, UserRule.user_id == User.id)
+            .where(User.enable == True, User.expire_time > now, User.outbound_id != outbound_id)
+            .distinct()
+        )
+        games: Dict[int, Set[int]] = {}
+        for target_id, rule_id in result.all():
+            games.setdefault(target_id, set()).add(rule_id)
+
+        # Greedy placement: users with the most games first, least-loaded target first
+        candidates = sorted(load, key=lambda target_id: (load[target_id], target_id))
+        moves: Dict[int, int] = {}
+        unplaced = []
+        for user_id in sorted(user_ids, key=lambda user_id: -len(user_rules[user_id])):
+            rules = user_rules[user_id]
+            for index, target_id in enumerate(candidates):
+                if rules.isdisjoint(games.get(target_id, ())):
+                    break
+            else:
+                unplaced.append(user_id)
+                continue
+
+            moves[user_id] = target_id
+            games.setdefault(target_id, set()).update(rules)
+            load[target_id] += 1
+            del candidates[index]
+            if load[target_id] < capacity[target_id]:
+                insort(candidates, target_id, key=lambda candidate: (load[candidate], candidate))
+
+        if unplaced and not partial:
+            raise ValueError(
+                f"Only {len(moves)} of {len(user_ids)} users can be moved without exceeding "
+                f"max_users or reusing an IP for the same game"
+            )
+
+        # One UPDATE per chunk: outbound_id = CASE id WHEN ... THEN ... END
+        moved_ids = list(moves)
+        updated_at = datetime.utcnow()
+        for start in range(0, len(moved_ids), DRAIN_UPDATE_CHUNK):
+            chunk = moved_ids[start:start + DRAIN_UPDATE_CHUNK]
+            await self.db.execute(
+                update(User)
+                .where(User.id.in_(chunk))
+                .values(
+                    outbound_id=case({user_id: moves[user_id] for user_id in chunk}, value=User.id),
+                    updated_at=updated_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+        await self.db.commit()
+
+        result = await self.db.execute(
+            select(User).where(User.id.in_(moved_ids)).execution_options(populate_existing=True)
+        )
+        moved_users = list(result.scalars().all())
+        affected_rules: Set[int] = set()
+        for user in moved_users:
+            occupancy.update_user(user.id, user.outbound_id, user.enable, user.expire_time)
+            affected_rules.update(user_rules[user.id])
+        event_bus.publish_users("user.updated", moved_users)
+        event_bus.publish_inventory(affected_rules)
+
+        job = await core_resync.resync(
+            self.db,
+            f"drain of outbound {source.name}",
+            select(User.id).where(User.id.in_(moved_ids))
+        ) if moved_ids else None
+
+        targets: Dict[int, int] = {}
+        for target_id in moves.values():
+            targets[target_id] = targets.get(target_id, 0) + 1
+
+        return {
+            "moved": moved_ids,
+            "unplaced": unplaced,
+            "targets": targets,
+            "resync_job": job.to_dict() if job else None
+        }
@@ -0,0 +1,131 @@
+"""
+Outbound Placement Engine
+Chooses which outbounds (IPs) new users of a game are placed on.
+"""
+from typing import Dict, List, NamedTuple, Optional
+from collections import defaultdict
+import heapq
+import os
+
+
+class PlacementCandidate(NamedTuple):
+    outbound_id: int
+    active_users: int
+    max_users: int
+    group: str  # Public IP / interface the outbound shares with others
+
+
+LEAST_LOADED = "least_loaded"
+ROUND_ROBIN = "round_robin"
+SPREAD = "spread"
+BIN_PACK = "bin_pack"
+
+STRATEGIES = (LEAST_LOADED, ROUND_ROBIN, SPREAD, BIN_PACK)
+
+DEFAULT_STRATEGY = os.getenv("PLACEMENT_STRATEGY", LEAST_LOADED)
+
+# rule_id -> last outbound_id handed out by round-robin
+_round_robin_cursor: Dict[int, int] = {}
+
+
+def placement_group(config: Optional[dict], local_interface_ip: Optional[str]) -> str:
+    """
+    Group key for spreading: outbounds on the same public IP share bandwidth.
+    Falls back to the local interface IP.
+    """
+    config = config or {}
+    return config.get("publicIp") or config.get("eh") or local_interface_ip or ""
+
+
+def get_round_robin_cursor(rule_id: Optional[int]) -> Optional[int]:
+    """Outbound ID handed out last by round-robin for a rule."""
+    return _round_robin_cursor.get(rule_id)
+
+
+def set_round_robin_cursor(rule_id: Optional[int], outbound_id: int) -> None:
+    _round_robin_cursor[rule_id] = outbound_id
+
+
+def choose(
+    candidates: List[PlacementCandidate],
+    count: int,
+    strategy: Optional[str] = None,
+    rule_id: Optional[int] = None,
+    advance: bool = True
+) -> List[int]:
+    """
+    Pick up to `count` distinct outbounds from candidates.
+
+    Strategies:
+    - least_loaded: fewest active users first
+    - round_robin: continue after the outbound picked last time for the rule
+    - spread: one outbound per public IP/interface before reusing a group
+    - bin_pack: most active users first, keeping whole IPs free
+    Ties are broken by outbound ID.
+
+    Args:
+        candidates: Outbounds that can take a user for the game
+        count: Number of outbounds needed
+        strategy: One of STRATEGIES (default: PLACEMENT_STRATEGY)
+        rule_id: Game the placement is for (round-robin cursor)
+        advance: Move the round-robin cursor (False for previews)
+
+    Returns:
+        Chosen outbound IDs, in placement order
+    """
+    strategy = strategy or DEFAULT_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown placement strategy '{strategy}'. Choose from: {', '.join(STRATEGIES)}")
+
+    if count <= 0 or not candidates:
+        return []
+
+    if strategy == LEAST_LOADED:
+        chosen = heapq.nsmallest(
+            count, candidates,
+            key=lambda c: (c.active_users, c.outbound_id)
+        )
+        return [c.outbound_id for c in chosen]
+
+    if strategy == BIN_PACK:
+        chosen = heapq.nsmallest(
+            count, candidates,
+            key=lambda c: (-c.active_users, c.outbound_id)
+        )
+        return [c.outbound_id for c in chosen]
+
+    if strategy == ROUND_ROBIN:
+        ordered = sorted(c.outbound_id for c in candidates)
+        last = _round_robin_cursor.get(rule_id) or 0
+        start = next((i for i, outbound_id in enumerate(ordered) if outbound_id > last), 0)
+        chosen_ids = (ordered[start:] + ordered[:start])[:count]
+        if advance:
+            _round_robin_cursor[rule_id] = chosen_ids[-1]
+        return chosen_ids
+
+    # SPREAD: cycle over groups (least-loaded group first), least-loaded outbound within each
+    groups: Dict[str, List[PlacementCandidate]] = defaultdict(list)
+    for candidate in candidates:
+        groups[candidate.group].append(candidate)
+
+    queues = []
+    for members in groups.values():
+        members.sort(key=lambda c: (c.active_users, c.outbound_id))
+        group_load = sum(c.active_users for c in members)
+        queues.append((group_load, members[0].outbound_id, members))
+    queues.sort(key=lambda q: (q[0], q[1]))
+
+    chosen_ids = []
+    depth = 0
+    while len(chosen_ids) < count:
+        progressed = False
+        for _, _, members in queues:
+            if depth < len(members):
+                chosen_ids.append(members[depth].outbound_id)
+                progressed = True
+                if len(chosen_ids) == count:
+                    break
+        if not progressed:
+            break
+        depth += 1
+    return chosen_ids
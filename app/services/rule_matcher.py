@@ -0,0 +1,272 @@
+"""
+Rule Matcher
+Compiles rule content into a lookup structure to answer "which rule decides
+this host:port" for a set of rules.
+
+Rule content is one entry per line in the Core format:
+
+    <host pattern>[:<port>] = allow|false
+
+- host patterns are globs (`*`, `?`); `*` alone matches everything
+- `example.com` matches exactly, `*.example.com` matches its subdomains
+- IPs and CIDRs (`10.0.0.0/8`, `2001:db8::/32`) match addresses in range;
+  IPv6 with a port is written `[2001:db8::1]:443`
+- port is `*`, a number or a range `1000-2000`; omitted means any port
+- blank lines and lines starting with `#` are ignored
+
+Entries are ranked by rule priority (highest first), then rule ID, then
+line order; the best-ranked matching entry decides. A target no entry
+matches is not allowed.
+"""
+from collections import OrderedDict
+from fnmatch import translate
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import ipaddress
+import re
+import socket
+
+# Compiled matchers kept for distinct rule sets
+MATCHER_CACHE_SIZE = 128
+
+# Memoized lookups per compiled matcher
+LOOKUP_MEMO_SIZE = 65536
+
+_ALLOW = {"allow", "true"}
+_DENY = {"false", "deny", "block"}
+_GLOB_CHARS = set("*?[")
+
+
+class RuleEntry(NamedTuple):
+    rank: int
+    rule_id: int
+    rule_name: str
+    line: int
+    pattern: str
+    allow: bool
+    port_min: int
+    port_max: int
+
+
+class _TrieNode:
+    __slots__ = ("children", "exact", "subdomains")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.exact: List[RuleEntry] = []  # entries for exactly this domain
+        self.subdomains: List[RuleEntry] = []  # entries for *.<this domain>
+
+
+def _parse_port(spec: str) -> Tuple[int, int]:
+    spec = spec.strip()
+    if spec in ("", "*"):
+        return 0, 65535
+    low, _, high = spec.partition("-")
+    port_min, port_max = int(low), int(high or low)
+    if not 0 <= port_min <= port_max <= 65535:
+        raise ValueError(f"invalid port '{spec}'")
+    return port_min, port_max
+
+
+def _split_host_port(target: str) -> Tuple[str, Optional[str]]:
+    """Split `host:port`, `[v6]:port`, bare IPv6 or bare host."""
+    target = target.strip()
+    if target.startswith("["):
+        host, _, rest = target[1:].partition("]")
+        return host, rest[1:] if rest.startswith(":") else None
+    if target.count(":") == 1:
+        host, _, port = target.partition(":")
+        return host, port
+    return target, None
+
+
+def _normalize_host(host: str) -> str:
+    return host.strip().lower().rstrip(".")
+
+
+def _parse_address(host: str) -> Optional[Tuple[int, int]]:
+    """(IP version, integer value) for an IP literal, None for a hostname."""
+    if not host or not (host[-1].isdigit() or ":" in host):
+        return None
+    for family, version in ((socket.AF_INET, 4), (socket.AF_INET6, 6)):
+        try:
+            return version, int.from_bytes(socket.inet_pton(family, host), "big")
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def parse_rule_content(rule_id: int, rule_name: str, content: str, rank_base: int = 0) -> Tuple[List[RuleEntry], List[str]]:
+    """
+    Parse rule content into entries.
+
+    Returns:
+        (entries, warnings) - unparseable lines are skipped with a warning
+    """
+    entries = []
+    warnings = []
+    for line_no, raw in enumerate(content.splitlines(), start=1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        pattern, sep, action = line.rpartition("=")
+        action = action.strip().lower()
+        if not sep or not pattern.strip():
+            warnings.append(f"{rule_name}:{line_no}: expected '<pattern> = allow|false'")
+            continue
+        if action not in _ALLOW and action not in _DENY:
+            warnings.append(f"{rule_name}:{line_no}: unknown action '{action}'")
+            continue
+
+        host, port = _split_host_port(pattern)
+        try:
+            port_min, port_max = _parse_port(port or "*")
+        except ValueError as e:
+            warnings.append(f"{rule_name}:{line_no}: {str(e)}")
+            continue
+
+        entries.append(RuleEntry(
+            rank_base + line_no, rule_id, rule_name, line_no, pattern.strip(),
+            action in _ALLOW, port_min, port_max
+        ))
+    return entries, warnings
+
+
+class CompiledMatcher:
+    """
+    Lookup structure for a ranked list of rule entries:
+    - literal domains and `*.` suffixes in a reversed-label trie
+    - IPs/CIDRs in per-prefix-length hash tables, longest prefix first
+    - everything else as compiled globs, scanned in rank order
+    """
+
+    def __init__(self, entries: Iterable[RuleEntry], warnings: Sequence[str] = ()):
+        self.warnings = list(warnings)
+        self.entry_count = 0
+        self._trie = _TrieNode()
+        self._networks: Dict[int, List[Tuple[int, int, Dict[int, List[RuleEntry]]]]] = {4: [], 6: []}
+        self._globs: List[Tuple[RuleEntry, Optional[re.Pattern]]] = []
+        self._memo: Dict[Tuple[str, Optional[int]], Optional[RuleEntry]] = {}
+
+        networks: Dict[Tuple[int, int], Dict[int, List[RuleEntry]]] = {}
+        for entry in sorted(entries):
+            self.entry_count += 1
+            host = _normalize_host(_split_host_port(entry.pattern)[0])
+
+            if host == "*":
+                self._globs.append((entry, None))
+                continue
+
+            try:
+                network = ipaddress.ip_network(host, strict=False)
+            except ValueError:
+                network = None
+            if network is not None:
+                table = networks.setdefault((network.version, network.prefixlen), {})
+                key = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+                table.setdefault(key, []).append(entry)
+                continue
+
+            suffix = host[2:] if host.startswith("*.") else host
+            if _GLOB_CHARS.isdisjoint(suffix):
+                node = self._trie
+                for label in reversed(suffix.split(".")):
+                    node = node.children.setdefault(label, _TrieNode())
+                (node.subdomains if host.startswith("*.") else node.exact).append(entry)
+            else:
+                self._globs.append((entry, re.compile(translate(host))))
+
+        for (version, prefixlen), table in networks.items():
+            bits = 32 if version == 4 else 128
+            self._networks[version].append((prefixlen, bits - prefixlen, table))
+        for tables in self._networks.values():
+            tables.sort(key=lambda item: item[0], reverse=True)
+
+    def match(self, host: str, port: Optional[int] = None) -> Optional[RuleEntry]:
+        """Best-ranked entry matching host (and port, if given), or None."""
+        key = (host, port)
+        if key in self._memo:
+            return self._memo[key]
+
+        host = _normalize_host(host)
+        best: Optional[RuleEntry] = None
+
+        address = _parse_address(host)
+        if address is not None:
+            version, value = address
+            lists = [table.get(value >> shift) for _, shift, table in self._networks[version]]
+        else:
+            lists = []
+            node = self._trie
+            labels = host.split(".")
+            for depth in range(len(labels) - 1, -1, -1):
+                node = node.children.get(labels[depth])
+                if node is None:
+                    break
+                lists.append(node.subdomains if depth else node.exact)
+
+        for candidates in lists:
+            if not candidates:
+                continue
+            for entry in candidates:
+                if best is not None and entry.rank >= best.rank:
+                    break
+                if port is None or entry.port_min <= port <= entry.port_max:
+                    best = entry
+                    break
+
+        for entry, regex in self._globs:
+            if best is not None and entry.rank >= best.rank:
+                break
+            if (port is None or entry.port_min <= port <= entry.port_max) and (regex is None or regex.match(host)):
+                best = entry
+                break
+
+        if len(self._memo) >= LOOKUP_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = best
+        return best
+
+    def match_target(self, target: str) -> Tuple[str, Optional[int], Optional[RuleEntry]]:
+        """Match a `host[:port]` string; returns (host, port, entry)."""
+        host, port = _split_host_port(target)
+        port_number = int(port) if port and port.isdigit() else None
+        return host, port_number, self.match(host, port_number)
+
+
+def compile_rules(rules: Sequence) -> CompiledMatcher:
+    """
+    Compile Rule rows (id, name, priority, content) into one matcher.
+    Rank follows priority (highest first), then rule ID, then line order.
+    """
+    entries = []
+    warnings = []
+    ordered = sorted(rules, key=lambda rule: (-(rule.priority or 0), rule.id))
+    for index, rule in enumerate(ordered):
+        rule_entries, rule_warnings = parse_rule_content(rule.id, rule.name, rule.content, rank_base=index << 20)
+        entries.extend(rule_entries)
+        warnings.extend(rule_warnings)
+    return CompiledMatcher(entries, warnings)
+
+
+_matcher_cache: "OrderedDict[tuple, CompiledMatcher]" = OrderedDict()
+
+
+def get_matcher(rules: Sequence) -> CompiledMatcher:
+    """
+    Compiled matcher for a rule set, cached by each rule's ID, name,
+    priority and content; a changed rule produces a new key and is compiled
+    again, unchanged rule sets reuse the cached matcher.
+    """
+    key = tuple(sorted((rule.id, rule.name, rule.priority or 0, rule.content) for rule in rules))
+    matcher = _matcher_cache.get(key)
+    if matcher is not None:
+        _matcher_cache.move_to_end(key)
+        return matcher
+
+    matcher = compile_rules(rules)
+    _matcher_cache[key] = matcher
+    if len(_matcher_cache) > MATCHER_CACHE_SIZE:
+        _matcher_cache.popitem(last=False)
+    return matcher
+
@@ -3,13 +3,69 @@ Rule Service Layer
 Handles traffic routing rules business logic.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List, Optional
+from sqlalchemy import select, delete, func, exists
+from pydantic import ValidationError
+from typing import Dict, List, Optional
 from datetime import datetime
+from collections import Counter
+import asyncio
+import csv
+import io
+import logging
+import time
 
-from app.models import Rule
+from app.database import begin_immediate
+from app.models import Rule, User, UserRule
 from app.schemas import RuleCreate, RuleUpdate
 from app.core_client import CoreAdapter, CoreConnectionError
+from app.services.game_inventory_service import invalidate_forecast_cache
+from app.services.occupancy import occupancy
+from app.services.rule_matcher import get_matcher
+from app.services.core_resync import core_resync
+
+logger = logging.getLogger(__name__)
+
+# Column order for CSV import/export
+RULE_CSV_FIELDS = ["name", "content", "priority", "remark"]
+
+# Parallel Core editRule calls when a merge import changes existing rules
+CORE_EDIT_CONCURRENCY = 10
+
+# Rule name the Core payload of a user without rules refers to
+ALL_RULE_NAME = "all"
+
+
+def parse_rules_csv(text: str) -> List[RuleCreate]:
+    """
+    Parse rules from CSV with a header row (name, content, priority, remark).
+    priority and remark may be omitted.
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    if not reader.fieldnames or not {"name", "content"} <= set(reader.fieldnames):
+        raise ValueError("CSV must have a header row with at least 'name' and 'content' columns")
+
+    rules = []
+    for line, row in enumerate(reader, start=2):
+        try:
+            rules.append(RuleCreate(
+                name=(row.get("name") or "").strip(),
+                content=row.get("content") or "",
+                priority=int(row["priority"]) if (row.get("priority") or "").strip() else 0,
+                remark=row.get("remark") or None
+            ))
+        except (ValidationError, ValueError) as e:
+            raise ValueError(f"Invalid rule on CSV line {line}: {str(e).splitlines()[0]}")
+    return rules
+
+
+def rules_to_csv(rules: List[Rule]) -> str:
+    """Serialize rules to CSV in RULE_CSV_FIELDS order."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RULE_CSV_FIELDS)
+    for rule in rules:
+        writer.writerow([rule.name, rule.content, rule.priority, rule.remark or ""])
+    return buffer.getvalue()
 
 
 class RuleService:
@@ -61,7 +117,8 @@ class RuleService:
         )
 
         self.db.add(rule)
-        await self.db.flush()
+        await self.db.commit()
+        invalidate_forecast_cache()
 
         # Sync to Core Service
         try:
@@ -69,19 +126,25 @@ class RuleService:
         except CoreConnectionError as e:
             print(f"Warning: Failed to sync rule to Core: {str(e)}")
 
-        await self.db.commit()
         await self.db.refresh(rule)
         return rule
 
     async def update(self, rule_id: int, rule_data: RuleUpdate) -> Rule:
         """
         Update existing rule.
-        Updates database and syncs to Core Service.
+        Updates database and syncs to Core Service. A rename adds the rule
+        under the new name in Core, re-pushes the users assigned to it and
+        then deletes the old name.
         """
         rule = await self.get_by_id(rule_id)
         if not rule:
             raise ValueError(f"Rule with ID {rule_id} not found")
 
+        old_name = rule.name
+        if rule_data.name is not None and rule_data.name != old_name:
+            if await self.get_by_name(rule_data.name):
+                raise ValueError(f"Rule with name '{rule_data.name}' already exists")
+
         # Update fields
         if rule_data.name is not None:
             rule.name = rule_data.name
@@ -93,14 +156,36 @@ class RuleService:
             rule.remark = rule_data.remark
 
         rule.updated_at = datetime.utcnow()
+        renamed = rule.name != old_name
+        await self.db.commit()
+        invalidate_forecast_cache()
 
         # Sync to Core Service
         try:
-            await self.core.edit_rule(name=rule.name, data=rule.content)
+            if renamed:
+                await self.core.add_rule(name=rule.name, data=rule.content)
+            else:
+                await self.core.edit_rule(name=rule.name, data=rule.content)
         except CoreConnectionError as e:
             print(f"Warning: Failed to sync rule update to Core: {str(e)}")
 
-        await self.db.commit()
+        if renamed:
+            async def delete_old_name(job, core: CoreAdapter) -> None:
+                if job.failed:
+                    print(f"Warning: Keeping rule {old_name} in Core, {job.failed} users still reference it")
+                    return
+                try:
+                    await core.delete_rule(old_name)
+                except CoreConnectionError as e:
+                    print(f"Warning: Failed to delete rule {old_name} from Core: {str(e)}")
+
+            await core_resync.resync(
+                self.db,
+                f"rule {old_name} renamed to {rule.name}",
+                select(UserRule.user_id).where(UserRule.rule_id == rule.id),
+                after=delete_old_name
+            )
+
         await self.db.refresh(rule)
         return rule
 
@@ -113,13 +198,216 @@ class RuleService:
         if not rule:
             raise ValueError(f"Rule with ID {rule_id} not found")
 
-        # Delete from Core Service first
+        # Delete from database
+        await self.db.delete(rule)
+        await self.db.commit()
+        occupancy.remove_rule(rule_id)
+        invalidate_forecast_cache()
+
         try:
             await self.core.delete_rule(rule.name)
         except CoreConnectionError as e:
             print(f"Warning: Failed to delete rule from Core: {str(e)}")
+        return True
 
-        # Delete from database
-        await self.db.delete(rule)
+    async def bulk_import(self, rules_data: List[RuleCreate], replace: bool = False) -> Dict:
+        """
+        Upsert many rules by name in one transaction and push them to Core
+        in one addRules call.
+
+        replace=False (merge): new rules are added, existing ones with changed
+        content/priority/remark are updated, other rules are left alone.
+        replace=True: the imported set becomes the full rule list; rules not in
+        it are deleted (refused while still assigned to users) and Core is
+        reloaded with deleteRuleAll + addRules. The "all" rule, which users
+        without rules reference implicitly, is always kept. If addRules fails
+        after deleteRuleAll, the previous rule set is pushed back so Core is
+        not left without rules.
+
+        The database is committed before Core is called, so the write lock
+        is not held across the Core requests.
+
+        Returns:
+            Counts of created/updated/unchanged/deleted rules and the Core error, if any
+        """
+        names = [rule_data.name for rule_data in rules_data]
+        duplicates = sorted(name for name, count in Counter(names).items() if count > 1)
+        if duplicates:
+            raise ValueError(f"Duplicate rule names in import: {', '.join(duplicates)}")
+
+        await begin_immediate(self.db)
+
+        existing = {rule.name: rule for rule in await self.get_all()}
+        imported = set(names)
+        # What Core holds now, to restore if a replace reload fails halfway
+        previous_core_rules = self._core_rule_payload(list(existing.values()))
+
+        removed = [rule for name, rule in existing.items() if name not in imported] if replace else []
+        kept = [rule for rule in removed if rule.name == ALL_RULE_NAME]
+        removed = [rule for rule in removed if rule.name != ALL_RULE_NAME]
+        if replace and ALL_RULE_NAME not in imported and not kept:
+            result = await self.db.execute(
+                select(User.id).where(~exists().where(UserRule.user_id == User.id)).limit(1)
+            )
+            if result.scalar_one_or_none() is not None:
+                raise ValueError(
+                    f"Users without rules use the '{ALL_RULE_NAME}' rule; include it in a replace import"
+                )
+        if removed:
+            result = await self.db.execute(
+                select(Rule.name)
+                .join(UserRule, UserRule.rule_id == Rule.id)
+                .where(Rule.id.in_([rule.id for rule in removed]))
+                .group_by(Rule.name)
+                .having(func.count(UserRule.id) > 0)
+            )
+            in_use = sorted(result.scalars().all())
+            if in_use:
+                raise ValueError(f"Cannot remove rules still assigned to users: {', '.join(in_use)}")
+
+        created, updated, unchanged = [], [], []
+        content_changed = []  # updated rules whose Core data differs
+        now = datetime.utcnow()
+        for rule_data in rules_data:
+            rule = existing.get(rule_data.name)
+            if rule is None:
+                rule = Rule(
+                    name=rule_data.name,
+                    content=rule_data.content,
+                    priority=rule_data.priority,
+                    remark=rule_data.remark
+                )
+                self.db.add(rule)
+                created.append(rule)
+            elif (rule.content, rule.priority, rule.remark) != (rule_data.content, rule_data.priority, rule_data.remark):
+                if rule.content != rule_data.content:
+                    content_changed.append(rule)
+                rule.content = rule_data.content
+                rule.priority = rule_data.priority
+                rule.remark = rule_data.remark
+                rule.updated_at = now
+                updated.append(rule)
+            else:
+                unchanged.append(rule)
+
+        if removed:
+            await self.db.execute(delete(Rule).where(Rule.id.in_([rule.id for rule in removed])))
         await self.db.commit()
-        return True
+        for rule in removed:
+            occupancy.remove_rule(rule.id)
+        invalidate_forecast_cache()
+
+        # Sync to Core Service
+        core_error = None
+        try:
+            if replace:
+                await self.core.delete_all_rules()
+                try:
+                    to_add = created + updated + unchanged + kept
+                    if to_add:
+                        await self.core.add_rules(self._core_rule_payload(to_add))
+                except CoreConnectionError:
+                    # Never leave Core without rules: put the previous set back
+                    await self._restore_core_rules(previous_core_rules)
+                    raise
+            else:
+                await self._edit_core_rules(content_changed)
+                if created:
+                    await self.core.add_rules(self._core_rule_payload(created))
+        except CoreConnectionError as e:
+            core_error = str(e)
+            logger.warning(f"Failed to sync imported rules to Core: {core_error}")
+
+        return {
+            "created": len(created),
+            "updated": len(updated),
+            "unchanged": len(unchanged),
+            "deleted": len(removed),
+            "core_error": core_error
+        }
+
+    @staticmethod
+    def _core_rule_payload(rules: List[Rule]) -> List[Dict]:
+        """addRules payload, highest priority first."""
+        ordered = sorted(rules, key=lambda rule: rule.priority, reverse=True)
+        return [{"name": rule.name, "data": rule.content} for rule in ordered]
+
+    async def _restore_core_rules(self, payload: List[Dict]) -> None:
+        """Re-push a rule set after a failed replace reload; failures are logged."""
+        if not payload:
+            return
+        try:
+            await self.core.add_rules(payload)
+            logger.warning(f"Restored the previous {len(payload)} rules in Core after a failed import")
+        except CoreConnectionError as e:
+            logger.error(f"Failed to restore previous rules in Core, Core has no rules: {str(e)}")
+
+    async def _edit_core_rules(self, rules: List[Rule]) -> None:
+        """editRule for each rule, CORE_EDIT_CONCURRENCY at a time."""
+        semaphore = asyncio.Semaphore(CORE_EDIT_CONCURRENCY)
+
+        async def edit(rule: Rule):
+            async with semaphore:
+                await self.core.edit_rule(name=rule.name, data=rule.content)
+
+        results = await asyncio.gather(*(edit(rule) for rule in rules), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def test_targets(
+        self,
+        targets: List[str],
+        user_id: Optional[int] = None,
+        rule_ids: Optional[List[int]] = None
+    ) -> Dict:
+        """
+        Evaluate host[:port] targets against a user's assigned rules (or
+        explicit rule IDs) with the compiled matcher. A user without rules
+        is checked against the rule named "all", as synced to Core.
+        """
+        if user_id is not None:
+            user = await self.db.get(User, user_id)
+            if not user:
+                raise ValueError(f"User with ID {user_id} not found")
+            result = await self.db.execute(
+                select(Rule).join(UserRule, UserRule.rule_id == Rule.id).where(UserRule.user_id == user_id)
+            )
+            rules = list(result.scalars().all())
+            if not rules:
+                default_rule = await self.get_by_name(ALL_RULE_NAME)
+                rules = [default_rule] if default_rule else []
+        elif rule_ids:
+            result = await self.db.execute(select(Rule).where(Rule.id.in_(rule_ids)))
+            rules = list(result.scalars().all())
+            missing = set(rule_ids) - {rule.id for rule in rules}
+            if missing:
+                raise ValueError(f"Rules not found: {', '.join(map(str, sorted(missing)))}")
+        else:
+            raise ValueError("Either user_id or rule_ids is required")
+
+        matcher = get_matcher(rules)
+
+        started = time.perf_counter()
+        results = []
+        for target in targets:
+            host, port, entry = matcher.match_target(target)
+            results.append({
+                "target": target,
+                "host": host,
+                "port": port,
+                "allowed": entry.allow if entry else False,
+                "rule_id": entry.rule_id if entry else None,
+                "rule_name": entry.rule_name if entry else None,
+                "line": entry.line if entry else None,
+                "pattern": entry.pattern if entry else None
+            })
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        return {
+            "rules": [rule.name for rule in sorted(rules, key=lambda rule: (-(rule.priority or 0), rule.id))],
+            "entries": matcher.entry_count,
+            "warnings": matcher.warnings,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "results": results
+        }
@@ -3,13 +3,16 @@ System Service Layer
 Handles system-level operations like stats, backups, etc.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, case
 from typing import Dict, Any
-from datetime import datetime
-import os
+from datetime import datetime, timezone
 
 from app.models import User
 from app.core_client import CoreAdapter, CoreConnectionError
+from app.services.online_tracker import online_tracker
+from app.services.backup_service import get_database_path
+from app.services.event_bus import event_bus
+from app.services.occupancy import occupancy
 
 
 class SystemService:
@@ -37,6 +40,7 @@ class SystemService:
             "total_users": 0,
             "active_users": 0,
             "expired_users": 0,
+            "disabled_users": 0,
             "system_version": "1.0.0",
             "uptime": "Unknown"
         }
@@ -81,42 +85,49 @@ class SystemService:
         except CoreConnectionError as e:
             print(f"Warning: Failed to get system info from Core: {str(e)}")
 
-        # Get user statistics from database
-        result = await self.db.execute(select(func.count(User.id)))
-        stats["total_users"] = result.scalar() or 0
+        # Get user statistics from database in a single pass.
+        # Effective status is derived from enable/expire_time at query time,
+        # so the counts stay correct between expiry checks.
+        stats.update(await self.get_user_status_counts())
 
-        result = await self.db.execute(
-            select(func.count(User.id)).where(User.status == "active")
-        )
-        stats["active_users"] = result.scalar() or 0
+        # Online users come from the background connection-list collector
+        stats["online_users"] = online_tracker.online_count()
+
+        return stats
+
+    async def get_user_status_counts(self) -> Dict[str, int]:
+        """
+        Count users by effective status with one GROUP BY query.
+
+        Returns:
+            {"total_users": int, "active_users": int, "expired_users": int, "disabled_users": int}
+        """
+        now = datetime.now(timezone.utc)
+
+        effective_status = case(
+            (User.enable == False, "disabled"),
+            (User.expire_time <= now, "expired"),
+            else_="active"
+        ).label("effective_status")
 
         result = await self.db.execute(
-            select(func.count(User.id)).where(User.status == "expired")
+            select(effective_status, func.count(User.id))
+            .group_by(effective_status)
         )
-        stats["expired_users"] = result.scalar() or 0
-
-        # Count online users (users with recent activity)
-        # For now, just use active users count
-        stats["online_users"] = stats["active_users"]
+        counts = {row[0]: row[1] for row in result.all()}
 
-        return stats
+        return {
+            "total_users": sum(counts.values()),
+            "active_users": counts.get("active", 0),
+            "expired_users": counts.get("expired", 0),
+            "disabled_users": counts.get("disabled", 0)
+        }
 
     async def get_database_path(self) -> str:
         """
         Get the path to the SQLite database file.
         """
-        db_url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./proxy_admin.db")
-
-        # Extract file path from database URL
-        # Format: sqlite+aiosqlite:///./proxy_admin.db
-        if ":///" in db_url:
-            db_path = db_url.split("///")[1]
-        else:
-            db_path = "./proxy_admin.db"
-
-        # Resolve to absolute path
-        abs_path = os.path.abspath(db_path)
-        return abs_path
+        return get_database_path()
 
     async def sync_traffic_from_core(self) -> int:
         """
@@ -188,16 +199,21 @@ class SystemService:
         for user in expired_users:
             user.status = "expired"
             user.updated_at = now
-
-            # Remove from Core Service
-            try:
-                await self.core.delete_user(f"0.0.0.0:{user.port}")
-            except CoreConnectionError as e:
-                print(f"Warning: Failed to remove expired user from Core: {str(e)}")
-
             expired_count += 1
 
         if expired_count > 0:
             await self.db.commit()
 
+            # Remove from Core Service
+            for user in expired_users:
+                try:
+                    await self.core.delete_user(f"0.0.0.0:{user.port}")
+                except CoreConnectionError as e:
+                    print(f"Warning: Failed to remove expired user from Core: {str(e)}")
+
+            event_bus.publish_users("user.updated", expired_users)
+            event_bus.publish_inventory(
+                rule_id for user in expired_users for rule_id in occupancy.user_rule_ids(user.id)
+            )
+
         return expired_count
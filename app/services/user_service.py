@@ -4,18 +4,74 @@ Handles proxy user business logic with Core Service synchronization.
 This is the critical service that manages the lifecycle of proxy users.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Set
+from datetime import datetime, timedelta, timezone
+import asyncio
 import logging
+import os
 
 from app.models import User, Outbound, Rule, UserRule
-from app.schemas import UserCreate, UserUpdate
+from app.database import begin_immediate, release_connection
+from app.schemas import UserCreate, UserUpdate, QuickUserCreate
 from app.core_client import CoreAdapter, CoreConnectionError
+from app.services.occupancy import occupancy
+from app.services.event_bus import event_bus
+from app.services.game_inventory_service import GameInventoryService
+from app.services.settings_service import SettingsService
 
 logger = logging.getLogger(__name__)
 
+# Port range used for automatic port allocation
+PORT_RANGE_START = int(os.getenv("PORT_RANGE_START", "10000"))
+PORT_RANGE_END = int(os.getenv("PORT_RANGE_END", "60000"))
+
+# Parallel Core deleteUser calls when a failed batch push is rolled back
+CORE_ROLLBACK_CONCURRENCY = 10
+
+
+def format_core_user_data(user: User, outbound_name: str, rule_names: List[str]) -> dict:
+    """
+    Format user data in Core API format from already loaded outbound/rule names.
+    Used directly by batch operations (quick create, core re-sync) to avoid
+    per-user lookups.
+    """
+    # Build config based on protocol
+    conf = user.config or {}
+    if user.protocol in ["socks5", "http"]:
+        conf = {
+            "username": user.username,
+            "password": user.password
+        }
+    elif user.protocol == "ss":
+        # For shadowsocks, use 'method' instead of 'username' in conf
+        conf = {
+            "method": user.username,  # encryption method (e.g., aes-128-gcm)
+            "password": user.password
+        }
+
+    # Format datetime
+    delete_time = user.expire_time.strftime("%Y-%m-%d %H:%M:%S")
+
+    return {
+        "enable": user.enable,
+        "listenAddr": f"0.0.0.0:{user.port}",
+        "protocol": user.protocol,
+        "deleteTime": delete_time,
+        "maxSendByte": user.total_traffic if user.total_traffic > 0 else 0,
+        "maxReceiveByte": user.total_traffic if user.total_traffic > 0 else 0,
+        "sendByte": user.up_traffic,
+        "receiveByte": user.down_traffic,
+        "maxConnCount": user.max_conn_count,
+        "sendLimit": user.send_limit,
+        "receiveLimit": user.receive_limit,
+        "rule": rule_names if rule_names else ["all"],
+        "out": outbound_name,
+        "conf": conf,
+        "info": user.remark or ""
+    }
+
 
 class UserService:
     """
@@ -88,6 +144,24 @@ class UserService:
         else:
             user.status = "active"
 
+    def _track_occupancy(self, user: User, rule_ids: Optional[List[int]] = None) -> Set[int]:
+        """
+        Apply a committed user change to the in-memory occupancy index.
+        rule_ids=None keeps the rules already known for the user.
+
+        Returns:
+            Rule IDs whose inventory may have changed (old and new rules)
+        """
+        affected = set(occupancy.user_rule_ids(user.id))
+        occupancy.update_user(user.id, user.outbound_id, user.enable, user.expire_time, rule_ids)
+        affected.update(occupancy.user_rule_ids(user.id))
+        return affected
+
+    def _publish_change(self, event_type: str, users: List[User], rule_ids: Set[int]) -> None:
+        """Publish committed user changes and the resulting inventory to SSE clients."""
+        event_bus.publish_users(event_type, users)
+        event_bus.publish_inventory(rule_ids)
+
     async def _build_core_user_data(self, user: User) -> dict:
         """
         Build user data in Core API format.
@@ -107,104 +181,156 @@ class UserService:
         rules = list(result.scalars().all())
         rule_names = [rule.name for rule in rules]
 
-        # Build config based on protocol
-        conf = user.config or {}
-        if user.protocol in ["socks5", "http"]:
-            conf = {
-                "username": user.username,
-                "password": user.password
-            }
-        elif user.protocol == "ss":
-            # For shadowsocks, use 'method' instead of 'username' in conf
-            conf = {
-                "method": user.username,  # encryption method (e.g., aes-128-gcm)
-                "password": user.password
-            }
-
-        # Format datetime
-        delete_time = user.expire_time.strftime("%Y-%m-%d %H:%M:%S")
-
-        return {
-            "enable": user.enable,
-            "listenAddr": f"0.0.0.0:{user.port}",
-            "protocol": user.protocol,
-            "deleteTime": delete_time,
-            "maxSendByte": user.total_traffic if user.total_traffic > 0 else 0,
-            "maxReceiveByte": user.total_traffic if user.total_traffic > 0 else 0,
-            "sendByte": user.up_traffic,
-            "receiveByte": user.down_traffic,
-            "maxConnCount": user.max_conn_count,
-            "sendLimit": user.send_limit,
-            "receiveLimit": user.receive_limit,
-            "rule": rule_names if rule_names else ["all"],
-            "out": outbound.name,
-            "conf": conf,
-            "info": user.remark or ""
-        }
+        return format_core_user_data(user, outbound.name, rule_names)
 
-    async def create(self, user_data: UserCreate) -> User:
+    async def _check_outbound_capacity(
+        self, outbound: Outbound, rule_ids: List[int], exclude_user_id: Optional[int] = None
+    ) -> None:
+        """
+        Enforce inventory rules for an active user placed on an outbound:
+        - the outbound has a free slot (active users < max_users)
+        - no active user already uses the outbound for any of the rules
+
+        exclude_user_id leaves the user being moved out of both checks.
+        Must run inside the write transaction that inserts/updates the user.
+        """
+        now = datetime.now(timezone.utc)
+        others = [User.id != exclude_user_id] if exclude_user_id is not None else []
+
+        result = await self.db.execute(
+            select(func.count(User.id))
+            .where(
+                User.outbound_id == outbound.id,
+                User.enable == True,
+                User.expire_time > now,
+                *others
+            )
+        )
+        active_users = result.scalar() or 0
+        if active_users >= outbound.max_users:
+            raise ValueError(
+                f"Outbound '{outbound.name}' is full ({active_users}/{outbound.max_users} users)"
+            )
+
+        if rule_ids:
+            result = await self.db.execute(
+                select(Rule.name)
+                .join(UserRule, Rule.id == UserRule.rule_id)
+                .join(User, UserRule.user_id == User.id)
+                .where(
+                    User.outbound_id == outbound.id,
+                    UserRule.rule_id.in_(rule_ids),
+                    User.enable == True,
+                    User.expire_time > now,
+                    *others
+                )
+                .limit(1)
+            )
+            taken_rule = result.scalar_one_or_none()
+            if taken_rule:
+                raise ValueError(f"Outbound '{outbound.name}' is already used for game '{taken_rule}'")
+
+    async def _check_user_placement(self, user: User, rule_ids: Optional[List[int]] = None) -> None:
+        """
+        Capacity check for an existing user that becomes active on its outbound
+        (moved, games changed, re-enabled or renewed). rule_ids=None uses the
+        user's current rules. Rolls back, releasing the write lock, on failure.
+        """
+        try:
+            outbound = await self.db.get(Outbound, user.outbound_id)
+            if not outbound:
+                raise ValueError(f"Outbound with ID {user.outbound_id} not found")
+            if rule_ids is None:
+                result = await self.db.execute(select(UserRule.rule_id).where(UserRule.user_id == user.id))
+                rule_ids = list(result.scalars().all())
+            await self._check_outbound_capacity(outbound, rule_ids, exclude_user_id=user.id)
+        except ValueError:
+            await self.db.rollback()
+            raise
+
+    async def create(self, user_data: UserCreate, check_capacity: bool = False) -> User:
         """
         Create new user.
         Saves to database and syncs to Core if enabled and not expired.
+
+        Port and outbound checks run inside a BEGIN IMMEDIATE transaction on
+        the single writer connection, so concurrent creates cannot both pass
+        them. The Core is synced after commit to keep the write lock short.
+
+        Args:
+            check_capacity: Also enforce max_users and per-game uniqueness on the outbound
         """
         print(f"=== CREATING USER: port={user_data.port}, protocol={user_data.protocol} ===")
         logger.info(f"Creating user on port {user_data.port}, protocol: {user_data.protocol}")
 
-        # Check if port already in use
-        existing = await self.get_by_port(user_data.port)
-        if existing:
-            raise ValueError(f"Port {user_data.port} is already in use")
+        await begin_immediate(self.db)
+        try:
+            # Check if port already in use
+            existing = await self.get_by_port(user_data.port)
+            if existing:
+                raise ValueError(f"Port {user_data.port} is already in use")
+
+            # Verify outbound exists
+            outbound = await self.db.get(Outbound, user_data.outbound_id)
+            if not outbound:
+                raise ValueError(f"Outbound with ID {user_data.outbound_id} not found")
+
+            print(f"=== USING OUTBOUND: {outbound.name} ===")
+            logger.info(f"Using outbound: {outbound.name}")
+
+            # Create user
+            user = User(
+                username=user_data.username,
+                password=user_data.password,
+                port=user_data.port,
+                protocol=user_data.protocol,
+                total_traffic=user_data.total_traffic,
+                expire_time=user_data.expire_time,
+                enable=user_data.enable,
+                send_limit=user_data.send_limit,
+                receive_limit=user_data.receive_limit,
+                max_conn_count=user_data.max_conn_count,
+                outbound_id=user_data.outbound_id,
+                config=user_data.config,
+                remark=user_data.remark,
+                email=user_data.email,
+                up_traffic=0,
+                down_traffic=0
+            )
 
-        # Verify outbound exists
-        outbound = await self.db.get(Outbound, user_data.outbound_id)
-        if not outbound:
-            raise ValueError(f"Outbound with ID {user_data.outbound_id} not found")
-
-        print(f"=== USING OUTBOUND: {outbound.name} ===")
-        logger.info(f"Using outbound: {outbound.name}")
-
-        # Create user
-        user = User(
-            username=user_data.username,
-            password=user_data.password,
-            port=user_data.port,
-            protocol=user_data.protocol,
-            total_traffic=user_data.total_traffic,
-            expire_time=user_data.expire_time,
-            enable=user_data.enable,
-            send_limit=user_data.send_limit,
-            receive_limit=user_data.receive_limit,
-            max_conn_count=user_data.max_conn_count,
-            outbound_id=user_data.outbound_id,
-            config=user_data.config,
-            remark=user_data.remark,
-            email=user_data.email,
-            up_traffic=0,
-            down_traffic=0
-        )
+            # Update status
+            self._update_user_status(user)
 
-        # Update status
-        self._update_user_status(user)
+            if check_capacity and user.status == "active":
+                await self._check_outbound_capacity(outbound, user_data.rule_ids)
 
-        self.db.add(user)
-        await self.db.flush()
+            self.db.add(user)
+            await self.db.flush()
 
-        # Associate rules
-        if user_data.rule_ids:
-            for rule_id in user_data.rule_ids:
-                user_rule = UserRule(user_id=user.id, rule_id=rule_id)
-                self.db.add(user_rule)
+            # Associate rules
+            if user_data.rule_ids:
+                for rule_id in user_data.rule_ids:
+                    user_rule = UserRule(user_id=user.id, rule_id=rule_id)
+                    self.db.add(user_rule)
 
-        await self.db.flush()
+            await self.db.flush()
+        except ValueError:
+            # Release the write lock right away
+            await self.db.rollback()
+            raise
+
+        await self.db.commit()
+        affected_rules = self._track_occupancy(user, user_data.rule_ids)
+        self._publish_change("user.created", [user], affected_rules)
 
         # Sync to Core Service
         should_sync = self._should_sync_to_core(user)
         logger.info(f"User {user.id} should_sync={should_sync}, enable={user.enable}, expire_time={user.expire_time}")
+        core_data = await self._build_core_user_data(user) if should_sync else None
+        await release_connection(self.db)
 
         if should_sync:
             try:
-                logger.info(f"Preparing to sync user {user.id} to Core Service...")
-                core_data = await self._build_core_user_data(user)
                 logger.info(f"Core data built: listenAddr={core_data.get('listenAddr')}, protocol={core_data.get('protocol')}")
                 logger.info(f"Core data conf: {core_data.get('conf')}")
                 logger.info(f"Full Core data: {core_data}")
@@ -222,8 +348,6 @@ class UserService:
             except CoreConnectionError:
                 pass  # It's okay if user doesn't exist in Core
 
-        await self.db.commit()
-
         # Reload user with relationships
         result = await self.db.execute(
             select(User)
@@ -232,16 +356,174 @@ class UserService:
         )
         return result.scalar_one()
 
+    async def allocate_ports(self, count: int) -> List[int]:
+        """
+        Pick the lowest `count` free ports in PORT_RANGE_START..PORT_RANGE_END.
+        """
+        result = await self.db.execute(
+            select(User.port).where(
+                User.port >= PORT_RANGE_START,
+                User.port <= PORT_RANGE_END
+            )
+        )
+        used_ports = set(row[0] for row in result.all())
+
+        ports = []
+        for port in range(PORT_RANGE_START, PORT_RANGE_END + 1):
+            if port not in used_ports:
+                ports.append(port)
+                if len(ports) == count:
+                    return ports
+
+        raise ValueError(f"Not enough free ports in range {PORT_RANGE_START}-{PORT_RANGE_END}")
+
+    async def quick_create(self, quick_data: QuickUserCreate) -> List[User]:
+        """
+        Create `count` users for a game in one go.
+
+        Reserves distinct available outbounds for the game, allocates ports,
+        generates credentials from system settings, inserts everything in one
+        transaction and pushes all users to the Core in one batch.
+
+        All-or-nothing. The rows are committed before the Core push: they are
+        what reserves the outbounds and ports, and the writer must not be held
+        across the push, so concurrent provisioning can only see the slots as
+        taken once they are in the database. If the push fails, the users Core
+        may already have created are deleted from it first (best effort), then
+        the rows are deleted, so ports are not reported free while listeners
+        could still exist.
+        """
+        rule = await self.db.get(Rule, quick_data.rule_id)
+        if not rule:
+            raise ValueError(f"Rule with ID {quick_data.rule_id} not found")
+
+        settings_service = SettingsService(self.db)
+        settings = await settings_service.get_settings()
+
+        # Reserve outbounds and ports inside the write transaction so concurrent
+        # provisioning cannot pick the same slots
+        await begin_immediate(self.db)
+
+        protocol = quick_data.protocol or settings.default_protocol
+        expiration_days = quick_data.expiration_days or settings.default_expiration_days
+        expire_time = datetime.now(timezone.utc) + timedelta(days=expiration_days)
+        send_limit = quick_data.send_limit if quick_data.send_limit is not None else settings.default_send_limit
+        receive_limit = quick_data.receive_limit if quick_data.receive_limit is not None else settings.default_receive_limit
+
+        # Reserve one distinct outbound per user; read from the database, not the
+        # in-memory index, since it is only updated after other writers commit
+        inventory = GameInventoryService(self.db, use_index=False)
+        outbounds = await inventory.choose_outbounds_for_game(rule.id, quick_data.count, quick_data.strategy)
+        if len(outbounds) < quick_data.count:
+            raise ValueError(
+                f"Not enough available IPs. Available: {len(outbounds)}, Requested: {quick_data.count}"
+            )
+
+        ports = await self.allocate_ports(quick_data.count)
+
+        users = []
+        for i, (outbound, port) in enumerate(zip(outbounds, ports)):
+            if protocol == "ss":
+                username = quick_data.method or await settings_service.generate_username("ss")
+            else:
+                username = settings_service.generate_credential(settings.username_pattern)
+            password = quick_data.password or settings_service.generate_credential(settings.password_pattern)
+
+            user = User(
+                username=username,
+                password=password,
+                port=port,
+                protocol=protocol,
+                total_traffic=settings.default_max_send_byte,
+                expire_time=expire_time,
+                enable=True,
+                send_limit=send_limit,
+                receive_limit=receive_limit,
+                max_conn_count=settings.default_max_conn_count,
+                outbound_id=outbound.id,
+                remark=f"{rule.name} - User {i + 1}",
+                up_traffic=0,
+                down_traffic=0
+            )
+            self._update_user_status(user)
+            users.append(user)
+
+        self.db.add_all(users)
+        await self.db.flush()
+
+        self.db.add_all([UserRule(user_id=user.id, rule_id=rule.id) for user in users])
+        await self.db.flush()
+
+        core_users = [
+            format_core_user_data(user, outbound.name, [rule.name])
+            for user, outbound in zip(users, outbounds)
+        ]
+        await self.db.commit()
+
+        # Push to Core in one batch; remove the users again on failure
+        try:
+            await self.core.create_users(core_users)
+        except CoreConnectionError as e:
+            logger.warning(f"Quick create of {len(users)} users failed in Core, rolling back: {str(e)}")
+            await self._delete_core_users([user.port for user in users])
+            user_ids = [user.id for user in users]
+            await self.db.execute(delete(UserRule).where(UserRule.user_id.in_(user_ids)))
+            await self.db.execute(delete(User).where(User.id.in_(user_ids)))
+            await self.db.commit()
+            raise ValueError(f"Failed to create users in Core, nothing was created: {str(e)}")
+
+        for user in users:
+            self._track_occupancy(user, [rule.id])
+        self._publish_change("user.created", users, {rule.id})
+
+        logger.info(f"Quick-created {len(users)} users for rule {rule.name}")
+
+        # Reload users with relationships
+        result = await self.db.execute(
+            select(User)
+            .where(User.id.in_([user.id for user in users]))
+            .options(selectinload(User.outbound), selectinload(User.rules))
+            .order_by(User.id)
+        )
+        return list(result.scalars().all())
+
+    async def _delete_core_users(self, ports: List[int]) -> None:
+        """deleteUser for each port, CORE_ROLLBACK_CONCURRENCY at a time; failures are logged."""
+        semaphore = asyncio.Semaphore(CORE_ROLLBACK_CONCURRENCY)
+
+        async def remove(port: int):
+            async with semaphore:
+                try:
+                    await self.core.delete_user(f"0.0.0.0:{port}")
+                except CoreConnectionError as e:
+                    logger.warning(f"Failed to remove user on port {port} from Core: {str(e)}")
+
+        await asyncio.gather(*(remove(port) for port in ports))
+
     async def update(self, user_id: int, user_data: UserUpdate) -> User:
         """
         Update existing user.
         Updates database and syncs to Core based on enable/expire status.
+
+        Moving an active user to another outbound, changing its games or
+        re-activating it (enable/expire_time) is checked like a create with
+        check_capacity (max_users and per-game uniqueness) inside a BEGIN
+        IMMEDIATE transaction.
         """
         user = await self.get_by_id(user_id)
         if not user:
             raise ValueError(f"User with ID {user_id} not found")
 
         old_port = user.port
+        was_active = self._should_sync_to_core(user)
+
+        placement_changed = user_data.outbound_id is not None and user_data.outbound_id != user.outbound_id
+        if user_data.rule_ids is not None and not placement_changed:
+            result = await self.db.execute(select(UserRule.rule_id).where(UserRule.user_id == user.id))
+            placement_changed = set(result.scalars().all()) != set(user_data.rule_ids)
+        may_reactivate = not was_active and (user_data.enable or user_data.expire_time is not None)
+        if placement_changed or may_reactivate or (user_data.port is not None and user_data.port != old_port):
+            await begin_immediate(self.db)
 
         # Update fields
         if user_data.username is not None:
@@ -278,25 +560,31 @@ class UserService:
         if user_data.email is not None:
             user.email = user_data.email
 
+        # Update status
+        self._update_user_status(user)
+
+        if user.status == "active" and (placement_changed or not was_active):
+            await self._check_user_placement(user, user_data.rule_ids)
+
         # Update rules if provided
         if user_data.rule_ids is not None:
             # Remove old rules
             await self.db.execute(
-                select(UserRule).where(UserRule.user_id == user.id)
+                delete(UserRule).where(UserRule.user_id == user.id)
             )
             # Add new rules
             for rule_id in user_data.rule_ids:
                 user_rule = UserRule(user_id=user.id, rule_id=rule_id)
                 self.db.add(user_rule)
 
-        # Update status
-        self._update_user_status(user)
         user.updated_at = datetime.now(datetime.now().astimezone().tzinfo)
 
         await self.db.flush()
 
         # Sync to Core Service
         should_sync = self._should_sync_to_core(user)
+        core_data = await self._build_core_user_data(user) if should_sync else None
+        await self.db.commit()
 
         # If port changed, delete old user from Core
         if user_data.port is not None and user_data.port != old_port:
@@ -308,7 +596,6 @@ class UserService:
         if should_sync:
             # User should be active - sync to Core
             try:
-                core_data = await self._build_core_user_data(user)
                 await self.core.sync_user(core_data)
             except CoreConnectionError as e:
                 logger.warning(f"Failed to sync user {user_id} update to Core: {str(e)}")
@@ -319,7 +606,8 @@ class UserService:
             except CoreConnectionError:
                 pass
 
-        await self.db.commit()
+        affected_rules = self._track_occupancy(user, user_data.rule_ids)
+        self._publish_change("user.updated", [user], affected_rules)
 
         # Reload user with relationships
         result = await self.db.execute(
@@ -332,18 +620,12 @@ class UserService:
     async def delete(self, user_id: int) -> bool:
         """
         Delete user.
-        Removes from database and Core Service.
+        Removes from database, then from Core Service.
         """
         user = await self.get_by_id(user_id)
         if not user:
             raise ValueError(f"User with ID {user_id} not found")
 
-        # Delete from Core Service first
-        try:
-            await self.core.delete_user(f"0.0.0.0:{user.port}")
-        except CoreConnectionError as e:
-            logger.warning(f"Failed to delete user {user_id} from Core: {str(e)}")
-
         # Delete user rules associations using SQL
         await self.db.execute(
             delete(UserRule).where(UserRule.user_id == user_id)
@@ -352,6 +634,16 @@ class UserService:
         # Delete from database
         await self.db.delete(user)
         await self.db.commit()
+
+        try:
+            await self.core.delete_user(f"0.0.0.0:{user.port}")
+        except CoreConnectionError as e:
+            logger.warning(f"Failed to delete user {user_id} from Core: {str(e)}")
+
+        affected_rules = occupancy.user_rule_ids(user_id)
+        occupancy.remove_user(user_id)
+        event_bus.publish_users_deleted([user_id])
+        event_bus.publish_inventory(affected_rules)
         return True
 
     async def reset_traffic(self, user_id: int) -> User:
@@ -366,15 +658,18 @@ class UserService:
         user.down_traffic = 0
         user.updated_at = datetime.now(datetime.now().astimezone().tzinfo)
 
+        should_sync = self._should_sync_to_core(user)
+        core_data = await self._build_core_user_data(user) if should_sync else None
+        await self.db.commit()
+
         # Sync to Core if user is active
-        if self._should_sync_to_core(user):
+        if should_sync:
             try:
-                core_data = await self._build_core_user_data(user)
                 await self.core.sync_user(core_data)
             except CoreConnectionError as e:
                 logger.warning(f"Failed to sync traffic reset for user {user_id} to Core: {str(e)}")
 
-        await self.db.commit()
+        event_bus.publish_users("user.updated", [user])
 
         # Reload user with relationships
         result = await self.db.execute(
@@ -388,23 +683,31 @@ class UserService:
         """
         Toggle user enable status.
         This is a convenience method for quickly enabling/disabling users.
+        Re-enabling is refused if the outbound has no room for the user.
         """
         user = await self.get_by_id(user_id)
         if not user:
             raise ValueError(f"User with ID {user_id} not found")
 
+        was_active = self._should_sync_to_core(user)
+        if not user.enable:
+            await begin_immediate(self.db)
+
         user.enable = not user.enable
         self._update_user_status(user)
+        if user.status == "active" and not was_active:
+            await self._check_user_placement(user)
         user.updated_at = datetime.now(datetime.now().astimezone().tzinfo)
 
         await self.db.flush()
 
         # Sync to Core
         should_sync = self._should_sync_to_core(user)
+        core_data = await self._build_core_user_data(user) if should_sync else None
+        await self.db.commit()
 
         if should_sync:
             try:
-                core_data = await self._build_core_user_data(user)
                 await self.core.sync_user(core_data)
             except CoreConnectionError as e:
                 logger.warning(f"Failed to sync toggle for user {user_id} to Core: {str(e)}")
@@ -414,7 +717,7 @@ class UserService:
             except CoreConnectionError:
                 pass
 
-        await self.db.commit()
+        self._publish_change("user.updated", [user], self._track_occupancy(user))
 
         # Reload user with relationships
         result = await self.db.execute(
@@ -429,27 +732,37 @@ class UserService:
         Renew/extend user expiration time.
         If user was expired and gets renewed, this will reactivate them in Core.
         This is the critical "recovery" feature mentioned in requirements.
+        Reactivation is refused if the outbound has no room for the user.
         """
         user = await self.get_by_id(user_id)
         if not user:
             raise ValueError(f"User with ID {user_id} not found")
 
+        was_active = self._should_sync_to_core(user)
+        if not was_active:
+            await begin_immediate(self.db)
+
         user.expire_time = new_expire_time
         user.enable = True  # Auto-enable when renewing
         self._update_user_status(user)
+        if user.status == "active" and not was_active:
+            await self._check_user_placement(user)
         user.updated_at = datetime.now(datetime.now().astimezone().tzinfo)
 
         await self.db.flush()
 
+        should_sync = self._should_sync_to_core(user)
+        core_data = await self._build_core_user_data(user) if should_sync else None
+        await self.db.commit()
+
         # Sync to Core (should now be active)
-        if self._should_sync_to_core(user):
+        if should_sync:
             try:
-                core_data = await self._build_core_user_data(user)
                 await self.core.sync_user(core_data)
             except CoreConnectionError as e:
                 logger.warning(f"Failed to sync renewal for user {user_id} to Core: {str(e)}")
 
-        await self.db.commit()
+        self._publish_change("user.updated", [user], self._track_occupancy(user))
 
         # Reload user with relationships
         result = await self.db.execute(
@@ -0,0 +1,413 @@
+"""
+Inventory and provisioning benchmark suite.
+
+Runs fully offline: a temporary SQLite database is filled with synthetic
+outbounds, rules and users, and the Core Service is replaced by an in-process
+fake that answers every call immediately. Each scenario is timed several times
+and the results are written to a JSON report that can be compared between commits.
+
+Usage:
+    python benchmark.py                                   # 10k outbounds x 500 rules x 100k users
+    python benchmark.py --outbounds 1000 --rules 50 --users 10000
+    python benchmark.py --output bench_new.json --compare bench_old.json
+
+Note: 100k users do not fit into one host's port space; synthetic users get
+ports from 70000 upwards, new users are provisioned in 1000-65535.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Synthetic users live above the real port range so provisioning finds free ports
+SYNTHETIC_PORT_START = 70000
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ProxyAdminPanel inventory/provisioning benchmark")
+    parser.add_argument("--outbounds", type=int, default=10000, help="Number of outbounds (IPs)")
+    parser.add_argument("--rules", type=int, default=500, help="Number of rules (games)")
+    parser.add_argument("--users", type=int, default=100000, help="Number of users")
+    parser.add_argument("--max-users", type=int, default=10, help="max_users per outbound")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per read scenario")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the data generator")
+    parser.add_argument("--output", default="benchmark_report.json", help="Report file to write")
+    parser.add_argument("--compare", help="Previous report to compare medians against")
+    parser.add_argument("--keep-db", action="store_true", help="Keep the temporary database")
+    return parser.parse_args()
+
+
+def configure_environment(workdir: str) -> str:
+    """Point the app at a temporary database and disable background tasks. Must run before importing app."""
+    db_path = os.path.join(workdir, "benchmark.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ["CORE_API_URL"] = "http://fake-core.invalid"
+    os.environ["CORE_API_KEY"] = "benchmark"
+    os.environ["PORT_RANGE_START"] = "1000"
+    os.environ["PORT_RANGE_END"] = "65535"
+    os.environ["OCCUPANCY_VERIFY_INTERVAL"] = "0"
+    os.environ["DASHBOARD_EVENT_INTERVAL"] = "0"
+    return db_path
+
+
+# ===========================
+# Fake Core
+# ===========================
+
+def make_fake_core():
+    from app.core_client import CoreAdapter
+
+    class FakeCore(CoreAdapter):
+        """CoreAdapter that answers every request in-process and counts calls per endpoint."""
+
+        def __init__(self):
+            super().__init__(base_url="http://fake-core.invalid", api_key="benchmark")
+            self.calls: Counter = Counter()
+            self.user_listing: List[Dict[str, Any]] = []
+
+        async def _request(self, method, endpoint, json=None, params=None):
+            self.calls[endpoint] += 1
+            if endpoint == "/api/user/getUserAll":
+                return {"code": 200, "data": self.user_listing}
+            return {"code": 200, "msg": "ok", "data": []}
+
+    return FakeCore()
+
+
+# ===========================
+# Synthetic Data
+# ===========================
+
+async def generate_data(args: argparse.Namespace) -> Dict[str, int]:
+    """
+    Bulk-insert synthetic data.
+
+    Users are spread round-robin over outbounds; the k-th user on an outbound
+    gets a rule that no earlier user on that outbound has, so the data respects
+    per-game uniqueness. About 80% are active, 10% expired (status not yet
+    updated) and 10% disabled.
+    """
+    from sqlalchemy import insert
+    from app.database import engine, init_database
+    from app.models import Outbound, Rule, User, UserRule, SystemSettings
+
+    await init_database()
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    outbounds = [
+        {
+            "id": i + 1,
+            "name": f"bench_out_{i + 1}",
+            "protocol": "direct",
+            "config": {"eh": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", "publicIp": f"203.0.{i // 16 % 256}.{i % 16}"},
+            "local_interface_ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            "is_auto_generated": True,
+            "max_users": args.max_users
+        }
+        for i in range(args.outbounds)
+    ]
+    rules = [
+        {"id": i + 1, "name": f"bench_game_{i + 1}", "content": f"*.game{i + 1}.example = allow", "priority": i}
+        for i in range(args.rules)
+    ]
+
+    users = []
+    user_rules = []
+    counts = Counter()
+    for i in range(args.users):
+        outbound_index = i % args.outbounds
+        depth = i // args.outbounds
+        rule_id = (outbound_index + depth * 7) % args.rules + 1
+
+        roll = rng.random()
+        if roll < 0.8:
+            enable, expire_time, kind = True, now + timedelta(days=rng.randint(1, 60), minutes=rng.randint(0, 1439)), "active"
+        elif roll < 0.9:
+            enable, expire_time, kind = True, now - timedelta(days=rng.randint(1, 30)), "expired"
+        else:
+            enable, expire_time, kind = False, now + timedelta(days=rng.randint(1, 60)), "disabled"
+        counts[kind] += 1
+
+        user_id = i + 1
+        users.append({
+            "id": user_id,
+            "username": f"bench{user_id}",
+            "password": "benchpass",
+            "port": SYNTHETIC_PORT_START + i,
+            "protocol": "socks5",
+            "total_traffic": 0,
+            "up_traffic": rng.randint(0, 10 ** 9),
+            "down_traffic": rng.randint(0, 10 ** 9),
+            "expire_time": expire_time,
+            "enable": enable,
+            "status": "disabled" if not enable else "active",
+            "outbound_id": outbound_index + 1
+        })
+        user_rules.append({"user_id": user_id, "rule_id": rule_id})
+
+    async with engine.begin() as conn:
+        await conn.execute(insert(Outbound), outbounds)
+        await conn.execute(insert(Rule), rules)
+        for start in range(0, len(users), 10000):
+            await conn.execute(insert(User), users[start:start + 10000])
+            await conn.execute(insert(UserRule), user_rules[start:start + 10000])
+        await conn.execute(insert(SystemSettings), [{"id": 1}])
+
+    return dict(counts)
+
+
+# ===========================
+# Timing
+# ===========================
+
+async def measure(
+    name: str,
+    scenario: Callable[[], Awaitable[Optional[int]]],
+    runs: int,
+    results: Dict[str, Dict]
+) -> None:
+    """Time `runs` executions of a scenario; the scenario may return an item count."""
+    timings = []
+    items = None
+    # Services print debug lines per user; keep them out of the report output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(runs):
+            started = time.perf_counter()
+            items = await scenario()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    results[name] = {
+        "runs": runs,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "items": items
+    }
+    print(f"  {name:<34} median {results[name]['median_ms']:>10.2f} ms  (min {results[name]['min_ms']:.2f}, max {results[name]['max_ms']:.2f})")
+
+
+async def run_scenarios(args: argparse.Namespace) -> Dict[str, Dict]:
+    from sqlalchemy import select
+    from app.database import async_session_maker
+    from app.models import User
+    from app.schemas import UserCreate, QuickUserCreate
+    from app.services.occupancy import occupancy
+    from app.services.game_inventory_service import GameInventoryService, invalidate_forecast_cache
+    from app.services.user_service import UserService
+    from app.services.system_service import SystemService
+
+    core = make_fake_core()
+    results: Dict[str, Dict] = {}
+    rng = random.Random(args.seed + 1)
+    rule_ids = list(range(1, args.rules + 1))
+
+    async def with_session(fn):
+        async with async_session_maker() as session:
+            return await fn(session)
+
+    # --- Index build ---
+    async def rebuild():
+        await occupancy.rebuild()
+        return occupancy.total_outbounds()
+    await measure("occupancy_rebuild", rebuild, 1, results)
+
+    # --- Inventory reads: SQL path vs index path ---
+    for label, use_index in (("sql", False), ("index", True)):
+        async def overview(use_index=use_index):
+            data = await with_session(lambda s: GameInventoryService(s, use_index).get_inventory_overview())
+            return len(data["games"])
+        await measure(f"inventory_overview_{label}", overview, args.runs, results)
+
+        async def game_inventory(use_index=use_index):
+            rule_id = rng.choice(rule_ids)
+            await with_session(lambda s: GameInventoryService(s, use_index).get_game_inventory(rule_id))
+            return 1
+        await measure(f"game_inventory_{label}", game_inventory, args.runs, results)
+
+        async def available(use_index=use_index):
+            rule_id = rng.choice(rule_ids)
+            found = await with_session(
+                lambda s: GameInventoryService(s, use_index).get_available_outbounds_for_game(rule_id, 100)
+            )
+            return len(found)
+        await measure(f"available_outbounds_{label}", available, args.runs, results)
+
+        async def placement(use_index=use_index):
+            rule_id = rng.choice(rule_ids)
+            chosen = await with_session(
+                lambda s: GameInventoryService(s, use_index).choose_outbounds_for_game(rule_id, 100, preview=True)
+            )
+            return len(chosen)
+        await measure(f"placement_100_{label}", placement, args.runs, results)
+
+    async def usage_all():
+        usage = await with_session(lambda s: GameInventoryService(s).get_all_outbound_usage())
+        return len(usage)
+    await measure("outbound_usage_all", usage_all, args.runs, results)
+
+    async def forecast():
+        invalidate_forecast_cache()
+        data = await with_session(lambda s: GameInventoryService(s).get_capacity_forecast(30))
+        return len(data["games"])
+    await measure("capacity_forecast_30d", forecast, args.runs, results)
+
+    # --- Provisioning ---
+    expire_time = datetime.now(timezone.utc) + timedelta(days=30)
+
+    async def provision_single():
+        rule_id = rng.choice(rule_ids)
+
+        async def create(session):
+            service = UserService(session, core)
+            free_ids = occupancy.available_outbound_ids(rule_id, 1)
+            if not free_ids:
+                return 0
+            port = (await service.allocate_ports(1))[0]
+            await service.create(
+                UserCreate(
+                    username=f"single{port}", password="benchpass", port=port,
+                    expire_time=expire_time, outbound_id=free_ids[0], rule_ids=[rule_id]
+                ),
+                check_capacity=True
+            )
+            return 1
+        return await with_session(create)
+    await measure("provision_single", provision_single, max(args.runs, 20), results)
+
+    async def provision_bulk():
+        rule_id = rng.choice(rule_ids)
+        created = await with_session(
+            lambda s: UserService(s, core).quick_create(QuickUserCreate(rule_id=rule_id, count=100))
+        )
+        return len(created)
+    await measure("provision_bulk_100", provision_bulk, args.runs, results)
+
+    # --- Maintenance jobs (state-changing, one run each) ---
+    async def load_listing(session):
+        result = await session.execute(
+            select(User.port, User.up_traffic, User.down_traffic).where(User.enable == True)
+        )
+        return [
+            {"listenAddr": f"0.0.0.0:{port}", "sendByte": (up or 0) + 1024, "receiveByte": (down or 0) + 4096}
+            for port, up, down in result.all()
+        ]
+    core.user_listing = await with_session(load_listing)
+
+    async def traffic_sync():
+        return await with_session(lambda s: SystemService(s, core).sync_traffic_from_core())
+    await measure("traffic_sync", traffic_sync, 1, results)
+
+    async def expiry():
+        return await with_session(lambda s: SystemService(s, core).check_expired_users())
+    await measure("expiry_check", expiry, 1, results)
+
+    results["_core_calls"] = dict(core.calls)
+    await core.close()
+    return results
+
+
+# ===========================
+# Report
+# ===========================
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(previous_path: str, current: Dict) -> None:
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+
+    print(f"\nComparison against {previous_path} (commit {previous['meta'].get('commit')}):")
+    print(f"  {'scenario':<34} {'before ms':>12} {'after ms':>12} {'change':>9}")
+    for name, result in current["scenarios"].items():
+        if name.startswith("_"):
+            continue
+        before = previous["scenarios"].get(name)
+        if not before:
+            print(f"  {name:<34} {'-':>12} {result['median_ms']:>12.2f} {'new':>9}")
+            continue
+        change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100 if before["median_ms"] else 0.0
+        print(f"  {name:<34} {before['median_ms']:>12.2f} {result['median_ms']:>12.2f} {change:>+8.1f}%")
+
+
+async def run(args: argparse.Namespace, db_path: str) -> Dict:
+    print(f"Generating {args.outbounds} outbounds x {args.rules} rules x {args.users} users ...")
+    started = time.perf_counter()
+    user_counts = await generate_data(args)
+    generation_seconds = time.perf_counter() - started
+    print(f"  done in {generation_seconds:.1f}s ({user_counts})")
+
+    print("Running scenarios:")
+    scenarios = await run_scenarios(args)
+
+    from app.database import close_database
+    await close_database()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "scale": {
+                "outbounds": args.outbounds,
+                "rules": args.rules,
+                "users": args.users,
+                "max_users": args.max_users,
+                "seed": args.seed
+            },
+            "users_by_state": user_counts,
+            "generation_seconds": round(generation_seconds, 2),
+            "database_bytes": os.path.getsize(db_path)
+        },
+        "scenarios": scenarios
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="proxyadmin_bench_")
+    db_path = configure_environment(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        report = asyncio.run(run(args, db_path))
+    finally:
+        if args.keep_db:
+            print(f"Database kept at {db_path}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        compare_reports(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
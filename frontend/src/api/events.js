@@ -0,0 +1,75 @@
+/**
+ * Live change events (Server-Sent Events)
+ *
+ * Events: user.created, user.updated, user.deleted, inventory, dashboard, core.resync, resync
+ * Returns a function that closes the stream.
+ *
+ * EventSource can only authenticate through the URL, so every (re)connect
+ * first fetches a short-lived stream token; the login token never goes into
+ * a URL. Reconnects resume from the last received event id.
+ */
+import request from '@/utils/request'
+
+const RECONNECT_DELAY_MS = 3000
+
+export function getStreamToken() {
+  return request({
+    url: '/events/token',
+    method: 'post'
+  })
+}
+
+export function subscribeEvents(handlers) {
+  let source = null
+  let lastEventId = null
+  let reconnectTimer = null
+  let closed = false
+
+  const scheduleReconnect = () => {
+    if (!closed && !reconnectTimer) {
+      reconnectTimer = setTimeout(() => {
+        reconnectTimer = null
+        connect()
+      }, RECONNECT_DELAY_MS)
+    }
+  }
+
+  const connect = async () => {
+    let token
+    try {
+      ({ token } = await getStreamToken())
+    } catch (error) {
+      scheduleReconnect()
+      return
+    }
+    if (closed) return
+
+    const params = new URLSearchParams({ token })
+    if (lastEventId) params.set('last_event_id', lastEventId)
+    source = new EventSource(`/api/events?${params}`)
+
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, event => {
+        if (event.lastEventId) lastEventId = event.lastEventId
+        handler(event.data ? JSON.parse(event.data) : {})
+      })
+    })
+    // After a resync the client has reloaded; start from the live stream
+    source.addEventListener('resync', () => {
+      lastEventId = null
+    })
+    // The browser would retry with the same URL, whose token has expired
+    source.onerror = () => {
+      source.close()
+      scheduleReconnect()
+    }
+  }
+
+  connect()
+
+  return () => {
+    closed = true
+    clearTimeout(reconnectTimer)
+    if (source) source.close()
+  }
+}
@@ -20,3 +20,27 @@ export function getOutboundUsage(outboundId) {
     method: 'get'
   })
 }
+
+export function getCapacityForecast(days = 7) {
+  return request({
+    url: '/game-inventory/forecast',
+    method: 'get',
+    params: { days }
+  })
+}
+
+export function getAllOutboundUsage(params) {
+  return request({
+    url: '/game-inventory/outbounds/usage',
+    method: 'get',
+    params
+  })
+}
+
+export function getAvailableOutbounds(ruleId, limit) {
+  return request({
+    url: `/game-inventory/${ruleId}/available-outbounds`,
+    method: 'get',
+    params: limit ? { limit } : {}
+  })
+}
@@ -1,9 +1,10 @@
 import request from '@/utils/request'
 
-export function getOutbounds() {
+export function getOutbounds(params = {}) {
   return request({
     url: '/outbounds',
-    method: 'get'
+    method: 'get',
+    params
   })
 }
 
@@ -37,9 +38,26 @@ export function deleteOutbound(id) {
   })
 }
 
-export function scanInterfaces() {
+export function scanInterfaces(prune = false) {
   return request({
     url: '/outbounds/scan',
-    method: 'post'
+    method: 'post',
+    params: prune ? { prune } : {}
+  })
+}
+
+export function getOutboundsHealth(probe = false) {
+  return request({
+    url: '/outbounds/health',
+    method: 'get',
+    params: probe ? { probe } : {}
+  })
+}
+
+export function drainOutbound(id, partial = false) {
+  return request({
+    url: `/outbounds/${id}/drain`,
+    method: 'post',
+    params: partial ? { partial } : {}
   })
 }
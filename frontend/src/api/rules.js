@@ -36,3 +36,39 @@ export function deleteRule(id) {
     method: 'delete'
   })
 }
+
+export function exportRules(format = 'json') {
+  return request({
+    url: '/rules/export',
+    method: 'get',
+    params: { format },
+    responseType: format === 'csv' ? 'blob' : 'json'
+  })
+}
+
+export function importRules(rules, mode = 'merge') {
+  return request({
+    url: '/rules/import',
+    method: 'post',
+    data: { rules, mode }
+  })
+}
+
+export function importRulesCsv(file, mode = 'merge') {
+  const data = new FormData()
+  data.append('file', file)
+  return request({
+    url: '/rules/import/csv',
+    method: 'post',
+    params: { mode },
+    data
+  })
+}
+
+export function testRules(data) {
+  return request({
+    url: '/rules/test',
+    method: 'post',
+    data
+  })
+}
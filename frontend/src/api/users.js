@@ -58,3 +58,18 @@ export function renewUser(id, expireTime) {
     params: { new_expire_time: expireTime }
   })
 }
+
+export function getUserOnlineStatus(id) {
+  return request({
+    url: `/users/${id}/online`,
+    method: 'get'
+  })
+}
+
+export function quickCreateUsers(data) {
+  return request({
+    url: '/users/quick-create',
+    method: 'post',
+    data
+  })
+}
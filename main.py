@@ -2,13 +2,24 @@
 Main FastAPI application entry point.
 ProxyAdminPanel - X-UI style proxy management system.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from contextlib import asynccontextmanager
 import logging
 
-from app.database import init_database
-from app.routers import auth, users, outbounds, rules, system, core_config, game_inventory, settings, external_api
+from app.database import init_database, close_database
+from app.services.online_tracker import online_tracker
+from app.services.backup_service import backup_scheduler
+from app.services.occupancy import occupancy
+from app.services.event_bus import event_bus
+from app.services.health_prober import health_prober
+from app.services.core_resync import core_resync
+from app.api_key_auth import api_key_cache
+from app.rate_limit import rate_limiter
+from app.auth import shutdown_password_hashing
+from app.routers import auth, users, outbounds, rules, system, core_config, game_inventory, settings, external_api, events
 
 # Configure logging
 logging.basicConfig(
@@ -26,11 +37,28 @@ async def lifespan(app: FastAPI):
     print("Starting ProxyAdminPanel...")
     await init_database()
     print("Database initialized.")
+    await occupancy.rebuild()
+    occupancy.start()
+    online_tracker.start()
+    backup_scheduler.start()
+    event_bus.start()
+    health_prober.start()
+    api_key_cache.start()
 
     yield
 
     # Shutdown
     print("Shutting down ProxyAdminPanel...")
+    await online_tracker.stop()
+    await backup_scheduler.stop()
+    await event_bus.stop()
+    await health_prober.stop()
+    await core_resync.stop()
+    await api_key_cache.stop()
+    rate_limiter.close()
+    shutdown_password_hashing()
+    await occupancy.stop()
+    await close_database()
 
 
 # Create FastAPI application
@@ -50,6 +78,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(PoolTimeoutError)
+async def database_busy_handler(request: Request, exc: PoolTimeoutError):
+    """No database connection became free within the pool timeout (e.g. the writer is busy)."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, try again shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -59,6 +98,7 @@ app.include_router(system.router)
 app.include_router(core_config.router)
 app.include_router(game_inventory.router)
 app.include_router(settings.router)
+app.include_router(events.router)
 # API key management removed for security - use create_api_key.py script instead
 app.include_router(external_api.router)
 
@@ -84,6 +84,20 @@ try:
     else:
         print(f"[OK] System settings already exist ({count} rows)")
 
+    # 4. Add composite index used by status counts and inventory queries
+    print("Creating users (enable, expire_time) index...")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_users_enable_expire_time ON users (enable, expire_time)"
+    )
+    print("[OK] ix_users_enable_expire_time index created")
+
+    # 5. Add user_rules (rule_id, user_id) index for per-game inventory
+    print("Creating user_rules (rule_id, user_id) index...")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_user_rules_rule_id_user_id ON user_rules (rule_id, user_id)"
+    )
+    print("[OK] ix_user_rules_rule_id_user_id index created")
+
     # Commit all changes
     conn.commit()
     print("\n[SUCCESS] Migration completed successfully!")
@@ -0,0 +1,96 @@
+"""Test that a revoked API key is rejected right away despite the key cache"""
+import asyncio
+import os
+import tempfile
+
+# Use a throwaway database; must be set before the app modules are imported
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/test.db"
+os.environ["API_KEY_CACHE_TTL"] = "3600"
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete
+
+from app.database import init_database, close_database, async_session_maker
+from app.models import APIKey
+from app.api_key_auth import generate_api_key, hash_api_key, get_key_prefix, verify_api_key
+
+
+async def create_key(name):
+    api_key = generate_api_key()
+    async with async_session_maker() as session:
+        session.add(APIKey(
+            name=name, key_hash=hash_api_key(api_key), key_prefix=get_key_prefix(api_key),
+            can_read=True, can_write=True, can_delete=False, rate_limit_per_minute=100, is_active=True
+        ))
+        await session.commit()
+    return api_key
+
+
+async def accepted(api_key):
+    try:
+        await verify_api_key(api_key)
+        return True
+    except HTTPException:
+        return False
+
+
+async def deactivate(api_key):
+    async with async_session_maker() as session:
+        key = (await session.execute(select(APIKey).where(APIKey.key_hash == hash_api_key(api_key)))).scalar_one()
+        key.is_active = False
+        await session.commit()
+
+
+async def delete_key(api_key):
+    async with async_session_maker() as session:
+        key = (await session.execute(select(APIKey).where(APIKey.key_hash == hash_api_key(api_key)))).scalar_one()
+        await session.delete(key)
+        await session.commit()
+
+
+async def bulk_deactivate(api_key):
+    async with async_session_maker() as session:
+        await session.execute(
+            update(APIKey).where(APIKey.key_hash == hash_api_key(api_key)).values(is_active=False)
+        )
+        await session.commit()
+
+
+async def bulk_delete(api_key):
+    async with async_session_maker() as session:
+        await session.execute(delete(APIKey).where(APIKey.key_hash == hash_api_key(api_key)))
+        await session.commit()
+
+
+async def main():
+    await init_database()
+    ok = True
+
+    for name, revoke in [
+        ("Disable key", deactivate),
+        ("Delete key", delete_key),
+        ("Disable key with UPDATE statement", bulk_deactivate),
+        ("Delete key with DELETE statement", bulk_delete),
+    ]:
+        api_key = await create_key(name)
+        if not await accepted(api_key):
+            print(f"[FAIL] {name}: new key rejected")
+            ok = False
+            continue
+        # Second request is answered from the cache
+        await accepted(api_key)
+        await revoke(api_key)
+        if await accepted(api_key):
+            print(f"[FAIL] {name}: next request still accepted")
+            ok = False
+        else:
+            print(f"[OK] {name}: next request rejected")
+
+    await close_database()
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        exit(1)
@@ -0,0 +1,79 @@
+"""Test that a failed quick-create push leaves no users in the database or in Core"""
+import asyncio
+import os
+import tempfile
+
+# Use a throwaway database; must be set before the app modules are imported
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/test.db"
+
+from sqlalchemy import select, func
+
+from app.database import init_database, close_database, async_session_maker
+from app.models import Outbound, Rule, User, UserRule
+from app.schemas import QuickUserCreate
+from app.core_client import CoreConnectionError
+from app.services.user_service import UserService
+
+
+class FailingCore:
+    """Core that creates the first users of a batch, then fails."""
+
+    def __init__(self, created_before_error: int):
+        self.created_before_error = created_before_error
+        self.listeners = set()
+
+    async def create_users(self, users_data):
+        for user_data in users_data[:self.created_before_error]:
+            self.listeners.add(user_data["listenAddr"])
+        raise CoreConnectionError("Core Service returned error 500: simulated failure")
+
+    async def delete_user(self, listen_addr):
+        if listen_addr not in self.listeners:
+            raise CoreConnectionError(f"Core Service returned error 404: {listen_addr} not found")
+        self.listeners.discard(listen_addr)
+        return {"code": 200}
+
+
+async def main():
+    await init_database()
+    async with async_session_maker() as session:
+        for i in range(3):
+            session.add(Outbound(name=f"out{i}", protocol="direct", config={"eh": f"10.0.0.{i}"}, max_users=10))
+        session.add(Rule(name="game", content="* = allow", priority=1))
+        await session.commit()
+        rule_id = (await session.execute(select(Rule.id))).scalar_one()
+
+    core = FailingCore(created_before_error=2)
+    print("=== Quick create 3 users, Core fails after creating 2 ===")
+    async with async_session_maker() as session:
+        try:
+            await UserService(session, core).quick_create(QuickUserCreate(rule_id=rule_id, count=3))
+            print("[FAIL] quick_create did not raise")
+            return False
+        except ValueError as e:
+            print(f"[OK] Raised: {e}")
+
+    ok = True
+    async with async_session_maker() as session:
+        users = (await session.execute(select(func.count(User.id)))).scalar()
+        user_rules = (await session.execute(select(func.count(UserRule.id)))).scalar()
+    if users == 0 and user_rules == 0:
+        print("[OK] No user rows left in the database")
+    else:
+        print(f"[FAIL] Left in database: {users} users, {user_rules} user rules")
+        ok = False
+
+    if not core.listeners:
+        print("[OK] No users left in Core")
+    else:
+        print(f"[FAIL] Left in Core: {sorted(core.listeners)}")
+        ok = False
+
+    await close_database()
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        exit(1)
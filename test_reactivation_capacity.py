@@ -0,0 +1,117 @@
+"""Test that re-enabling or renewing a user onto a full outbound is refused"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# Use a throwaway database; must be set before the app modules are imported
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/test.db"
+
+from app.database import init_database, close_database, async_session_maker
+from app.models import Outbound, Rule, User, UserRule
+from app.schemas import UserUpdate
+from app.services.user_service import UserService
+
+
+class NullCore:
+    """Core that accepts every call."""
+
+    async def sync_user(self, user_data):
+        return {"code": 200}
+
+    async def delete_user(self, listen_addr):
+        return {"code": 200}
+
+
+def make_user(port, outbound_id, enable=True, days=30):
+    return User(
+        username=f"user{port}", password="Pass@123", port=port, protocol="socks5",
+        total_traffic=0, up_traffic=0, down_traffic=0, outbound_id=outbound_id,
+        enable=enable, expire_time=datetime.utcnow() + timedelta(days=days)
+    )
+
+
+async def setup():
+    """
+    full:   max_users=1, one active user (game1), one disabled and one expired user
+    shared: max_users=10, one active user of game1, one disabled user of game1
+    free:   max_users=10, one disabled user of game1
+    """
+    await init_database()
+    async with async_session_maker() as session:
+        full = Outbound(name="full", protocol="direct", config={"eh": "10.0.0.1"}, max_users=1)
+        shared = Outbound(name="shared", protocol="direct", config={"eh": "10.0.0.2"}, max_users=10)
+        free = Outbound(name="free", protocol="direct", config={"eh": "10.0.0.3"}, max_users=10)
+        game1 = Rule(name="game1", content="* = allow", priority=1)
+        game2 = Rule(name="game2", content="* = allow", priority=2)
+        session.add_all([full, shared, free, game1, game2])
+        await session.flush()
+
+        users = {
+            "full_active": (make_user(20001, full.id), game1),
+            "full_disabled": (make_user(20002, full.id, enable=False), game2),
+            "full_expired": (make_user(20003, full.id, days=-1), game2),
+            "shared_active": (make_user(20004, shared.id), game1),
+            "shared_disabled": (make_user(20005, shared.id, enable=False), game1),
+            "free_disabled": (make_user(20006, free.id, enable=False), game1),
+        }
+        for user, _ in users.values():
+            session.add(user)
+        await session.flush()
+        for user, rule in users.values():
+            session.add(UserRule(user_id=user.id, rule_id=rule.id))
+        await session.commit()
+        return {name: user.id for name, (user, _) in users.items()}
+
+
+async def expect(name, action, refused):
+    async with async_session_maker() as session:
+        service = UserService(session, NullCore())
+        try:
+            await action(service)
+            ok = not refused
+            outcome = "allowed"
+        except ValueError as e:
+            ok = refused
+            outcome = f"refused ({e})"
+    print(f"{'[OK]' if ok else '[FAIL]'} {name}: {outcome}")
+    return ok
+
+
+async def main():
+    ids = await setup()
+    renew_to = datetime.utcnow() + timedelta(days=30)
+
+    results = [
+        await expect("Re-enable on a full outbound",
+                     lambda s: s.toggle_enable(ids["full_disabled"]), refused=True),
+        await expect("Renew an expired user on a full outbound",
+                     lambda s: s.renew_user(ids["full_expired"], renew_to), refused=True),
+        await expect("Update enable=True on a full outbound",
+                     lambda s: s.update(ids["full_disabled"], UserUpdate(enable=True)), refused=True),
+        await expect("Update expire_time of an expired user on a full outbound",
+                     lambda s: s.update(ids["full_expired"], UserUpdate(expire_time=renew_to)), refused=True),
+        await expect("Re-enable where the game is already served",
+                     lambda s: s.toggle_enable(ids["shared_disabled"]), refused=True),
+        await expect("Renew where the game is already served",
+                     lambda s: s.renew_user(ids["shared_disabled"], renew_to), refused=True),
+        await expect("Renew an active user on a full outbound",
+                     lambda s: s.renew_user(ids["full_active"], renew_to), refused=False),
+        await expect("Re-enable on an outbound with room",
+                     lambda s: s.toggle_enable(ids["free_disabled"]), refused=False),
+    ]
+
+    async with async_session_maker() as session:
+        user = await session.get(User, ids["full_disabled"])
+        if user.enable:
+            print("[FAIL] Refused re-enable was still saved")
+            results.append(False)
+
+    await close_database()
+    return all(results)
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        exit(1)